@@ -5,17 +5,11 @@ Python requests wrapper for the Ex Libris Alma API
 """
 
 
+import importlib
+
 from .client import Client
-from .bibs import SubClientBibs
-from .analytics import SubClientAnalytics
-from .courses import SubClientCourses
-from .users import SubClientUsers
-from .acquisitions import SubClientAcquistions
-from .conf import SubClientConfiguration
-from .partners import SubClientPartners
-from .electronic import SubClientElectronic
-from .task_lists import SubClientTaskList
 from . import utils
+from . import serializers
 
 
 __author__ = "Steve Pelkey, Fco. Sanchez"
@@ -28,6 +22,35 @@ __version__ = "1.0.1.dev0"
 __status__ = "Development"
 
 
+# API modules are only imported when first used, see AlmaCnxn and __getattr__.
+_LAZY_ATTRIBUTES = {
+    'SubClientBibs': 'bibs',
+    'SubClientAnalytics': 'analytics',
+    'SubClientCourses': 'courses',
+    'SubClientUsers': 'users',
+    'SubClientAcquistions': 'acquisitions',
+    'SubClientConfiguration': 'conf',
+    'SubClientPartners': 'partners',
+    'SubClientElectronic': 'electronic',
+    'SubClientTaskList': 'task_lists',
+}
+_LAZY_MODULES = ['bibs', 'analytics', 'courses', 'users', 'acquisitions', 'conf',
+                 'partners', 'electronic', 'task_lists', 'marc', 'export']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module('.' + _LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    if name in _LAZY_MODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_MODULES))
+
+
 class AlmaCnxn(Client):
     """"Interface with Alma APIs.
 
@@ -43,9 +66,30 @@ class AlmaCnxn(Client):
         Location (str): Geographic location of library.
         data_format (str): Format of returned data. json or xml.
             If xml is selected, data will be returned as python xml ElementTree.
+        single_flight (bool): Send identical GET calls made at the same time
+            from several threads only once. See utils.SingleFlight.
+        cache_ttl (float): Seconds GET responses are cached. Writes evict the
+            entries they affect, see utils.ResponseCache. Disabled by default.
+        json_backend (str): json library used to encode and decode data.
+            'auto' picks the fastest one installed (orjson, ujson, then the
+            standard library). See serializers.get_backend().
+        lazy (bool): Return successful json and xml responses as a
+            client.LazyResponse, whose body is only parsed when read.
+            xml fields are read without parsing the rest of the body;
+            json bodies are parsed in full on the first read.
+
+    Thread safety:
+        One AlmaCnxn can be shared by many threads, including threads
+        running paginated (all_records) calls at the same time. Connection
+        parameters are read-only once the connection is built, and every
+        API and subclient works on its own frozen copy of them. Query
+        arguments are copied on every call. The objects shared through the
+        parameters (the json backend, single flight registry and response
+        cache) are thread-safe.
     """
 
-    def __init__(self, apikey, location='America', data_format='json'):
+    def __init__(self, apikey, location='America', data_format='json', single_flight=True,
+                 cache_ttl=None, json_backend='auto', lazy=False):
 
         super(AlmaCnxn, self).__init__()
 
@@ -68,8 +112,10 @@ class AlmaCnxn(Client):
             message = "Format argument must be either 'json' or 'xml'"
             raise utils.ArgError(message)
         self.cnxn_params['format'] = data_format
+        self.cnxn_params['json_backend'] = serializers.get_backend(json_backend)
+        self.cnxn_params['lazy'] = lazy
         ns = {'header': 'http://com/exlibris/urm/general/xmlbeans'}
-        self.cnxn_params['xml_ns'] = ns
+        self.cnxn_params['xml_ns'] = utils.frozen(ns)
 
         # TODO: validate api key. return list of accessible endpoints
         # call __validate_key__
@@ -78,16 +124,28 @@ class AlmaCnxn(Client):
         # Set 'User-Agent' for REST queries
         self.cnxn_params['User-Agent'] = '{}/{}'.format(__name__,__version__)
 
-        # Hook in the various Alma APIs based on what API key can access
-        self.bibs = SubClientBibs(self.cnxn_params)
-        self.analytics = SubClientAnalytics(self.cnxn_params)
-        self.courses = SubClientCourses(self.cnxn_params)
-        self.users = SubClientUsers(self.cnxn_params)
-        self.acq = SubClientAcquistions(self.cnxn_params)
-        self.conf = SubClientConfiguration(self.cnxn_params)
-        self.partners = SubClientPartners(self.cnxn_params)
-        self.electronic = SubClientElectronic(self.cnxn_params)
-        self.task_lists = SubClientTaskList(self.cnxn_params)
+        # Registry of GET calls in flight, shared by all subclients.
+        self.single_flight = utils.SingleFlight() if single_flight else None
+        self.cnxn_params['single_flight'] = self.single_flight
+
+        # GET response cache, shared by all subclients.
+        self.cache = utils.ResponseCache(cache_ttl) if cache_ttl else None
+        self.cnxn_params['cache'] = self.cache
+
+        # Hook in the various Alma APIs based on what API key can access.
+        # Each API module is imported and its client created on first access.
+        self.__lazy__(bibs='bibs.SubClientBibs',
+                      analytics='analytics.SubClientAnalytics',
+                      courses='courses.SubClientCourses',
+                      users='users.SubClientUsers',
+                      acq='acquisitions.SubClientAcquistions',
+                      conf='conf.SubClientConfiguration',
+                      partners='partners.SubClientPartners',
+                      electronic='electronic.SubClientElectronic',
+                      task_lists='task_lists.SubClientTaskList')
+
+        # Connection parameters are read-only from here on, see the class docstring.
+        self.cnxn_params = utils.frozen(self.cnxn_params)
 
     def __validate_key__(self, apikey):
         # loop through each api and access the /test endpoint.
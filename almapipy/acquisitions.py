@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
-from .client import Client
+import copy
+import time
+
+from .client import Client, LazyResponse
+from . import export
 from . import utils
 
 
@@ -23,12 +27,98 @@ class SubClientAcquistions(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of api
-        self.funds = SubClientAcquistionsFunds(self.cnxn_params)
-        self.po_lines = SubClientAcquistionsPO(self.cnxn_params)
-        self.vendors = SubClientAcquistionsVendors(self.cnxn_params)
-        self.invoices = SubClientAcquistionsInvoices(self.cnxn_params)
-        self.licenses = SubClientAcquistionsLicenses(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(funds=SubClientAcquistionsFunds,
+                      po_lines=SubClientAcquistionsPO,
+                      vendors=SubClientAcquistionsVendors,
+                      invoices=SubClientAcquistionsInvoices,
+                      licenses=SubClientAcquistionsLicenses)
+
+    def export_ledger(self, sink, include_all=True, checkpoint=None,
+                      max_workers=8, progress=None):
+        """Exports the invoices and PO lines of every vendor.
+
+        Vendors are fanned out over one worker pool. The first page of each
+        vendor's invoices and PO lines fans out the remaining pages
+        concurrently. Each record is written to the sink with two extra
+        fields: 'record_type' ('invoice' or 'po_line') and 'vendor_code'.
+
+        Args:
+            sink: Object with write(row) and flush(), e.g. export.NDJSONSink
+                or export.CSVSink.
+            include_all (bool): Also page through invoices.get() and
+                po_lines.get(), to catch records not listed under a vendor.
+                Records found under both paths are written once per run.
+            checkpoint (export.Checkpoint): Tracks exported vendors and
+                records. Vendors already in it are skipped, so a rerun
+                resumes, and records already in it are not written again.
+            max_workers (int): Number of calls made at the same time.
+            progress (callable): Called with export statistics after each flush.
+
+        Returns:
+            Dictionary of export statistics. See export.crawl().
+                'duplicates' counts records dropped by deduplication.
+        """
+        limit = 100
+        q_params = {'format': 'json'}
+        listings = {
+            ('invoice', True): lambda code, offset: self.vendors.get_invoices(
+                code, limit=limit, offset=offset, q_params=q_params),
+            ('po_line', True): lambda code, offset: self.vendors.get_po_lines(
+                code, limit=limit, offset=offset, q_params=q_params),
+            ('invoice', False): lambda code, offset: self.invoices.get(
+                limit=limit, offset=offset, q_params=q_params),
+            ('po_line', False): lambda code, offset: self.po_lines.get(
+                limit=limit, offset=offset, q_params=q_params),
+        }
+
+        def get_vendors(limit, offset):
+            return self.vendors.get(limit=limit, offset=offset, q_params=q_params)
+
+        def expand(node):
+            if node[0] == 'vendor':
+                code = node[1]['code']
+                return [('page', 'invoice', code, 0), ('page', 'po_line', code, 0)], []
+
+            record_type, code, offset = node[1:]
+            response = listings[(record_type, code is not None)](code, offset)
+            rows = []
+            for record in response.get(record_type) or []:
+                row = dict(record)
+                row['record_type'] = record_type
+                row['vendor_code'] = code or (record.get('vendor') or {}).get('value')
+                rows.append(row)
+
+            children = []
+            if offset == 0:
+                total = int(response.get('total_record_count', 0))
+                children = [('page', record_type, code, next_offset)
+                            for next_offset in range(limit, total, limit)]
+            return children, rows
+
+        def roots():
+            for vendor in utils.iter_records(get_vendors, 'vendor'):
+                yield ('vendor', vendor)
+            if include_all:
+                yield ('page', 'invoice', None, 0)
+                yield ('page', 'po_line', None, 0)
+
+        def root_key(node):
+            if node[0] == 'vendor':
+                return node[1]['code']
+            return '*' + node[1]
+
+        def row_key(row):
+            if row['record_type'] == 'po_line':
+                return ('po_line', row.get('number'))
+            return ('invoice', row.get('id'))
+
+        unique = export.UniqueSink(sink, row_key, checkpoint=checkpoint)
+        stats = export.crawl(roots(), expand, unique, checkpoint=checkpoint,
+                             key=root_key, max_workers=max_workers,
+                             progress=progress)
+        stats['duplicates'] = unique.duplicates
+        return stats
 
 
 class SubClientAcquistionsFunds(Client):
@@ -75,6 +165,143 @@ class SubClientAcquistionsFunds(Client):
                                          response=response, data_key='fund')
         return response
 
+    def monitor(self, interval=None, library=None, callback=None, max_workers=4):
+        """Returns a FundMonitor holding an indexed copy of the funds.
+
+        Args:
+            interval (float): Seconds between background refreshes.
+                Funds are loaded once if not specified.
+            library (str): The code of the library that owns the PO line
+                for which the relevant funds should be retrieved.
+            callback (callable): Called with each balance change event.
+            max_workers (int): Number of pages fetched at the same time.
+
+        Returns:
+            FundMonitor, already loaded.
+        """
+        monitor = FundMonitor(self, library=library, callback=callback,
+                              max_workers=max_workers)
+        monitor.refresh(notify=False)
+        if interval:
+            monitor.start(interval)
+        return monitor
+
+
+class FundMonitor(object):
+    """
+    Local copy of the fund list, indexed by fund code and refreshed on an interval.
+
+    Each refresh fetches all pages of the fund list concurrently and calls
+    callback once per fund whose available balance changed, with an event
+    {'code': ..., 'old': ..., 'new': ...}. Added and removed funds are
+    reported with an old or new balance of None. The first copy, loaded by
+    funds.monitor(), is not reported.
+
+    Args:
+        funds (SubClientAcquistionsFunds): Client used to fetch funds.
+        library (str): Library code to filter funds with. See funds.get().
+        callback (callable): Called with each change event.
+        max_workers (int): Number of pages fetched at the same time.
+    """
+
+    def __init__(self, funds, library=None, callback=None, max_workers=4):
+        self.funds = funds
+        self.library = library
+        self.callback = callback
+        self.max_workers = max_workers
+        self.index = {}
+        self.refreshed = None
+        self._refresher = None
+
+    def refresh(self, notify=True):
+        """Fetches the funds again and reports balance changes.
+
+        Args:
+            notify (bool): Call the callback with the change events.
+
+        Returns:
+            List of change events.
+        """
+        def get_page(limit, offset):
+            return self.funds.get(limit=limit, offset=offset, library=self.library,
+                                  q_params={'format': 'json'})
+
+        records = utils.fetch_pages(get_page, 'fund', max_workers=self.max_workers)
+        index = {fund['code']: fund for fund in records}
+
+        events = []
+        for code in sorted(set(index) | set(self.index)):
+            old = self.balance(code)
+            new = self.__available__(index.get(code))
+            if old != new:
+                events.append({'code': code, 'old': old, 'new': new})
+
+        self.index = index
+        self.refreshed = time.time()
+        if notify and self.callback is not None:
+            for event in events:
+                self.callback(event)
+        return events
+
+    def __available__(self, fund):
+        if fund is None:
+            return None
+        balance = fund.get('available_balance')
+        if isinstance(balance, dict):
+            balance = balance.get('sum')
+        return None if balance is None else float(balance)
+
+    def balance(self, code):
+        """Returns the available balance of a fund from memory."""
+        return self.__available__(self.index.get(code))
+
+    def start(self, interval):
+        """Refreshes the funds every interval seconds in the background."""
+        self.stop()
+        self._refresher = utils.Periodic(self.refresh, interval)
+        self._refresher.start()
+
+    def stop(self):
+        """Stops background refreshes."""
+        if self._refresher is not None:
+            self._refresher.stop()
+
+
+class ReceivingQueue(object):
+    """
+    Items expected for a set of PO lines, indexed for a receiving workbench.
+
+    Attributes:
+        po_lines (dict): {po_line_number: po_line}.
+        items (dict): {po_line_number: [items]}.
+        by_barcode (dict): {barcode: item}.
+        by_expected_date (dict): {expected_arrival_date: [items]}, sorted by date.
+    """
+
+    def __init__(self):
+        self.po_lines = {}
+        self.items = {}
+        self.by_barcode = {}
+        self.by_expected_date = {}
+
+    def add(self, po_line, items):
+        number = po_line['number']
+        self.po_lines[number] = po_line
+        self.items[number] = items
+        for item in items:
+            item_data = item.get('item_data') or {}
+            if item_data.get('barcode'):
+                self.by_barcode[item_data['barcode']] = item
+            date = (item_data.get('expected_arrival_date') or '').rstrip('Z') or None
+            self.by_expected_date.setdefault(date, []).append(item)
+
+    def sort(self):
+        dates = sorted(self.by_expected_date, key=lambda date: (date is None, date or ''))
+        self.by_expected_date = {date: self.by_expected_date[date] for date in dates}
+
+    def __len__(self):
+        return len(self.po_lines)
+
 
 class SubClientAcquistionsPO(Client):
     """Handles the PO Lines endpoints of Acquisitions API"""
@@ -84,6 +311,9 @@ class SubClientAcquistionsPO(Client):
         self.cnxn_params['api_uri'] += '/po-lines'
         self.cnxn_params['api_uri_full'] += '/po-lines'
 
+        # Items of PO lines, kept between openings of a receiving queue.
+        self.items_cache = utils.TTLCache(ttl=600)
+
     def get(self, po_line_id=None, query={}, limit=10, offset=0,
             all_records=False, q_params={}, raw=False):
         """Retrieve a list or a single PO-Line.
@@ -162,6 +392,44 @@ class SubClientAcquistionsPO(Client):
         response = self.read(url, args, raw=raw)
         return response
 
+    def receiving_queue(self, query={}, max_workers=8):
+        """Builds a receiving queue from the PO lines matching a search query.
+
+        Matching PO lines are streamed page by page while their items are
+        fetched concurrently. Items are cached for a while (see
+        self.items_cache.ttl), so reopening the queue skips most calls.
+
+        Args:
+            query (dict): Search query for filtering PO lines. See get().
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            ReceivingQueue.
+        """
+        q_params = {'format': 'json'}
+
+        def get_page(limit, offset):
+            return self.get(query=query, limit=limit, offset=offset, q_params=q_params)
+
+        def fetch(po_line):
+            # The queue hands its items out, so the cache keeps its own copy.
+            number = po_line['number']
+            items = self.items_cache.get(number)
+            if items is not None:
+                return copy.deepcopy(items)
+            items = self.get_items(number, q_params=q_params).get('item') or []
+            self.items_cache.set(number, copy.deepcopy(items))
+            return items
+
+        queue = ReceivingQueue()
+        po_lines = utils.iter_records(get_page, 'po_line')
+        for po_line, items, error in utils.concurrent_map(fetch, po_lines, max_workers):
+            if error is not None:
+                raise error
+            queue.add(po_line, items)
+        queue.sort()
+        return queue
+
 
 class SubClientAcquistionsVendors(Client):
     """Handles the Vendor endpoints of Acquisitions API"""
@@ -473,3 +741,64 @@ class SubClientAcquistionsLicenses(Client):
 
         response = self.read(url, args, raw=raw)
         return response
+
+    def get_all_with_amendments(self, status='ALL', review_status='ALL',
+                                cache_dir=None, max_workers=8):
+        """Retrieves every license together with its amendments.
+
+        License pages and the amendments of each license are fetched
+        concurrently. With cache_dir, amendment bodies are kept on disk by
+        amendment ID, and are only fetched again when their entry in the
+        license's amendment list changes.
+
+        Args:
+            status (str): License status. See get().
+            review_status (str): License review status. See get().
+            cache_dir (str): Folder of the amendment cache.
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            List of licenses, each with an 'amendments' list of full amendments.
+        """
+        q_params = {'format': 'json'}
+        cache = utils.FileCache(cache_dir) if cache_dir else None
+
+        def get_page(limit, offset):
+            return self.get(status=status, review_status=review_status,
+                            limit=limit, offset=offset, q_params=q_params)
+
+        def list_amendments(license):
+            response = self.get_amendments(license['code'], q_params=q_params)
+            return response.get('amendment') or []
+
+        def fetch_amendment(task):
+            license, position, entry = task
+            amendment = self.get_amendments(license['code'], entry['code'], q_params=q_params)
+            if isinstance(amendment, LazyResponse):
+                amendment = amendment.content
+            return amendment
+
+        licenses = utils.fetch_pages(get_page, 'license', max_workers=max_workers)
+
+        missing = []
+        for license, entries, error in utils.concurrent_map(list_amendments, licenses, max_workers):
+            if error is not None:
+                raise error
+            license['amendments'] = [None] * len(entries)
+            for position, entry in enumerate(entries):
+                cached = cache.get(entry['code']) if cache else None
+                if cached and cached['entry_hash'] == utils.content_hash(entry):
+                    license['amendments'][position] = cached['amendment']
+                else:
+                    missing.append((license, position, entry))
+
+        for task, amendment, error in utils.concurrent_map(fetch_amendment, missing, max_workers):
+            if error is not None:
+                raise error
+            license, position, entry = task
+            if cache:
+                cache.set(entry['code'], {'entry_hash': utils.content_hash(entry),
+                                          'amendment': amendment})
+            license['amendments'][position] = amendment
+
+        return licenses
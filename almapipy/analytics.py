@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from .client import Client
+from .client import Client, LazyResponse
 from . import utils
 import xml.etree.ElementTree as ET
 
@@ -20,11 +20,14 @@ class SubClientAnalytics(Client):
         self.cnxn_params['wadl_url'] = "https://developers.exlibrisgroup.com/resources/wadl/10788916-19f6-4f19-aaf1-c18fa0c31ccd.wadl"
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
-        self.cnxn_params['xml_ns']['report'] = 'urn:schemas-microsoft-com:xml-analysis:rowset'
+        # Extend a copy of the namespaces, which are shared with every other API.
+        xml_ns = dict(self.cnxn_params['xml_ns'])
+        xml_ns['report'] = 'urn:schemas-microsoft-com:xml-analysis:rowset'
+        self.cnxn_params['xml_ns'] = utils.frozen(xml_ns)
 
-        # Hook in subclients of api
-        self.paths = SubClientAnalyticsPaths(self.cnxn_params)
-        self.reports = SubClientAnalyticsReports(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(paths=SubClientAnalyticsPaths,
+                      reports=SubClientAnalyticsReports)
 
 
 class SubClientAnalyticsPaths(Client):
@@ -106,6 +109,8 @@ class SubClientAnalyticsReports(Client):
         set_tag = "{urn:schemas-microsoft-com:xml-analysis:rowset}rowset"
         columns_tag = "{http://www.w3.org/2001/XMLSchema}element"
         report = self.read(url, args, raw=raw)
+        if isinstance(report, LazyResponse):
+            report = report.content
 
         if raw:
             # extract xml from raw response
@@ -134,6 +139,8 @@ class SubClientAnalyticsReports(Client):
             while get_more:
 
                 report_more = self.read(url, margs, raw=raw)
+                if isinstance(report_more, LazyResponse):
+                    report_more = report_more.content
 
                 if raw:
                     responses += [report_more]
@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from .client import Client
+import copy
+
+from .client import Client, LazyResponse
+from . import export
 from . import utils
 
 
@@ -20,13 +23,112 @@ class SubClientBibs(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of bib
-        self.catalog = SubClientBibsCatalog(self.cnxn_params)
-        self.collections = SubClientBibsCollections(self.cnxn_params)
-        self.loans = SubClientBibsLoans(self.cnxn_params)
-        self.requests = SubClientBibsRequests(self.cnxn_params)
-        self.representations = SubClientBibsRepresentations(self.cnxn_params)
-        self.linked_data = SubClientBibsLinkedData(self.cnxn_params)
+        # Hook in subclients of bib, created on first access
+        self.__lazy__(catalog=SubClientBibsCatalog,
+                      collections=SubClientBibsCollections,
+                      loans=SubClientBibsLoans,
+                      requests=SubClientBibsRequests,
+                      representations=SubClientBibsRepresentations,
+                      linked_data=SubClientBibsLinkedData)
+
+    def export_circulation(self, pid, sink, checkpoint=None, max_workers=8):
+        """Exports loans and requests for every title of a collection.
+
+        Bibs of the collection are streamed page by page, and loans and
+        requests of each title are fetched concurrently. One row per title
+        is written to the sink as soon as it is ready:
+        {'mms_id': ..., 'title': ..., 'loans': [...], 'requests': [...]}
+
+        Args:
+            pid (str): The collection ID.
+            sink: Object with write(row) and flush(), e.g. export.NDJSONSink.
+            checkpoint (export.Checkpoint): Tracks exported titles.
+                Titles already in it are skipped, so a rerun resumes.
+            max_workers (int): Number of titles fetched at the same time.
+
+        Returns:
+            Dictionary of export statistics. See export.stream().
+        """
+        def fetch(bib):
+            bib_id = bib['mms_id']
+
+            def get_loans(limit, offset):
+                q_params = {'format': 'json', 'limit': limit, 'offset': offset}
+                return self.loans.get_by_title(bib_id, q_params=q_params)
+
+            def get_requests(limit, offset):
+                q_params = {'format': 'json', 'limit': limit, 'offset': offset}
+                return self.requests.get_by_title(bib_id, q_params=q_params)
+
+            return [{'mms_id': bib_id,
+                     'title': bib.get('title'),
+                     'loans': list(utils.iter_records(get_loans, 'item_loan')),
+                     'requests': list(utils.iter_records(get_requests, 'user_request'))}]
+
+        return export.stream(self.__iter_collection__(pid), fetch, sink,
+                             checkpoint=checkpoint,
+                             key=lambda bib: bib['mms_id'],
+                             max_workers=max_workers)
+
+    def export_representations(self, sink, bib_ids=None, pid=None,
+                               checkpoint=None, max_workers=8):
+        """Exports a flat manifest of digital representations and their files.
+
+        Representations and file lists are fetched concurrently, and one row
+        per file is written to the sink as soon as its bib is done:
+        {'mms_id': ..., 'rep_id': ..., 'file_id': ..., 'path': ...,
+         'size': ..., 'mime_type': ...}
+        Representations without files are written with empty file fields.
+
+        Args:
+            sink: Object with write(row) and flush(), e.g. export.NDJSONSink.
+            bib_ids (iterable): bib IDs (mms_id) to crawl. Consumed lazily.
+            pid (str): Collection ID to crawl instead of bib_ids.
+            checkpoint (export.Checkpoint): Tracks crawled bibs.
+                Bibs already in it are skipped, so a rerun resumes.
+            max_workers (int): Number of bibs crawled at the same time.
+
+        Returns:
+            Dictionary of export statistics. See export.stream().
+        """
+        if (bib_ids is None) == (pid is None):
+            message = "Either bib_ids or pid is required."
+            raise utils.ArgError(message)
+        if pid is not None:
+            bib_ids = (bib['mms_id'] for bib in self.__iter_collection__(pid))
+
+        q_params = {'format': 'json'}
+
+        def fetch(bib_id):
+            def get_page(limit, offset):
+                page_params = {'format': 'json', 'limit': limit, 'offset': offset}
+                return self.representations.get(bib_id, q_params=page_params)
+
+            rows = []
+            for rep in utils.iter_records(get_page, 'representation'):
+                rep_id = str(rep['id'])
+                files = self.representations.get_details(bib_id, rep_id, files=True,
+                                                         q_params=q_params)
+                files = files.get('representation_file') or [{}]
+                for rep_file in files:
+                    rows.append({'mms_id': bib_id,
+                                 'rep_id': rep_id,
+                                 'file_id': rep_file.get('pid'),
+                                 'path': rep_file.get('path'),
+                                 'size': rep_file.get('size'),
+                                 'mime_type': rep_file.get('mime_type')})
+            return rows
+
+        return export.stream(bib_ids, fetch, sink, checkpoint=checkpoint,
+                             max_workers=max_workers)
+
+    def __iter_collection__(self, pid):
+        """Yields the bibs of a collection, one page at a time."""
+        def get_page(limit, offset):
+            q_params = {'format': 'json', 'limit': limit, 'offset': offset}
+            return self.collections.get_bibs(pid, q_params=q_params)
+
+        return utils.iter_records(get_page, 'bib')
 
 
 class SubClientBibsCatalog(Client):
@@ -291,6 +393,9 @@ class SubClientBibsRequests(Client):
     def __init__(self, cnxn_params={}):
         self.cnxn_params = cnxn_params.copy()
 
+        # Short lived cache shared by the batch methods.
+        self.cache = utils.TTLCache(ttl=30)
+
     def get_by_item(self, bib_id, holding_id, item_id,
                     request_id=None, q_params={}, raw=False):
         """Returns Loan by Item information.
@@ -416,6 +521,120 @@ class SubClientBibsRequests(Client):
 
         return self.read(url, args, raw=raw)
 
+    def get_options_batch(self, bibs, user_ids=['GUEST'], max_workers=8,
+                          q_params={}):
+        """Returns request options for every combination of bibs and users.
+
+        Calls are made concurrently. Duplicate combinations are requested
+        once, and results are cached for a few seconds (see self.cache.ttl).
+
+        Args:
+            bibs (list): bib IDs (mms_id), or (bib_id, holding_id, item_id)
+                tuples for specific items.
+            user_ids (list): ids of the users for which the request options
+                will be calculated.
+            max_workers (int): Number of calls made at the same time.
+            q_params (dict): Any additional query parameters.
+
+        Returns:
+            Matrix of request options as {bib: {user_id: options}}.
+                Items given as lists are keyed by the equivalent tuple.
+                Cells whose call failed hold the raised utils.AlmaError.
+        """
+        def fetch(key):
+            bib_id, holding_id, item_id, user_id = key
+            return self.get_options(bib_id, user_id=user_id,
+                                    holding_id=holding_id, item_id=item_id,
+                                    q_params=q_params)
+
+        keys = [self.__batch_key__(bib) + (str(user_id),)
+                for bib in bibs for user_id in user_ids]
+        results = self.__get_batch__('options', fetch, keys, max_workers, q_params)
+
+        matrix = {}
+        for bib in bibs:
+            row = matrix.setdefault(self.__batch_label__(bib), {})
+            for user_id in user_ids:
+                key = self.__batch_key__(bib) + (str(user_id),)
+                row[user_id] = self.__batch_result__(results[key])
+        return matrix
+
+    def get_availability_batch(self, bibs, period, period_type='days',
+                               max_workers=8, q_params={}):
+        """Returns booking availability for many titles or items.
+
+        Calls are made concurrently. Duplicate entries are requested
+        once, and results are cached for a few seconds (see self.cache.ttl).
+
+        Args:
+            bibs (list): bib IDs (mms_id), or (bib_id, holding_id, item_id)
+                tuples for specific items.
+            period (str or int): The number of days/weeks/months to retrieve availability for.
+            period_type (str):  The type of period of interest. Optional. Possible values: days, weeks, months.
+            max_workers (int): Number of calls made at the same time.
+            q_params (dict): Any additional query parameters.
+
+        Returns:
+            Dictionary of {bib: periods title/item is unavailable for booking}.
+                Items given as lists are keyed by the equivalent tuple.
+                Entries whose call failed hold the raised utils.AlmaError.
+        """
+        def fetch(key):
+            bib_id, holding_id, item_id, period, period_type = key
+            return self.get_availability(bib_id, period, period_type=period_type,
+                                         holding_id=holding_id, item_id=item_id,
+                                         q_params=q_params)
+
+        keys = [self.__batch_key__(bib) + (str(period), str(period_type))
+                for bib in bibs]
+        results = self.__get_batch__('availability', fetch, keys, max_workers, q_params)
+
+        return {self.__batch_label__(bib): self.__batch_result__(results[key])
+                for bib, key in zip(bibs, keys)}
+
+    def __batch_label__(self, bib):
+        """Returns bib as given, with lists turned into tuples to be a dictionary key."""
+        if type(bib) == list:
+            return tuple(bib)
+        return bib
+
+    def __batch_result__(self, result):
+        """Copies a result, so callers cannot change what is cached."""
+        if isinstance(result, utils.Error):
+            return result
+        return copy.deepcopy(result)
+
+    def __batch_key__(self, bib):
+        """Normalizes a bib ID or (bib_id, holding_id, item_id) tuple."""
+        if type(bib) in [tuple, list]:
+            if len(bib) != 3:
+                message = "Items must be given as (bib_id, holding_id, item_id)."
+                raise utils.ArgError(message)
+            return tuple(str(i) for i in bib)
+        return (str(bib), None, None)
+
+    def __get_batch__(self, kind, fetch, keys, max_workers, q_params):
+        """Fetches unique keys not already cached. Returns {key: result}."""
+        params = tuple(sorted((str(k), str(v)) for k, v in q_params.items()))
+        results = {}
+        missing = []
+        for key in set(keys):
+            cached = self.cache.get((kind, key, params))
+            if cached is None:
+                missing.append(key)
+            else:
+                results[key] = cached
+
+        for key, result, error in utils.concurrent_map(fetch, missing, max_workers):
+            if error is not None:
+                if not isinstance(error, utils.Error):
+                    raise error
+                results[key] = error
+            else:
+                self.cache.set((kind, key, params), result)
+                results[key] = result
+        return results
+
 
 class SubClientBibsRepresentations(Client):
     """Handles Digital Representations"""
@@ -498,3 +717,38 @@ class SubClientBibsLinkedData(Client):
         args['apikey'] = self.cnxn_params['api_key']
 
         return self.read(url, args, raw=raw)
+
+    def export(self, bib_ids, sink, checkpoint=None, max_workers=8,
+               rate=25, retries=3):
+        """Exports Linked data for a stream of Bib MMS-IDs.
+
+        Documents are fetched concurrently under the rate limit and written
+        to the sink as they arrive. An ID that fails with a throttling,
+        server or network error is retried by its worker, without holding
+        back the others.
+
+        Args:
+            bib_ids (iterable): bib IDs (mms_id). Consumed lazily.
+            sink: Object with write(document) and flush(), e.g.
+                export.NDJSONSink or export.JSONLDChunkSink.
+            checkpoint (export.Checkpoint): Tracks exported bibs.
+                Bibs already in it are skipped, so a rerun resumes.
+            max_workers (int): Number of bibs fetched at the same time.
+            rate (float): Maximum number of calls per second.
+            retries (int): Times a failed bib is retried.
+
+        Returns:
+            Dictionary of export statistics. See export.stream().
+        """
+        def fetch(bib_id):
+            document = self.get(bib_id)
+            if isinstance(document, LazyResponse):
+                document = document.content
+            elif not isinstance(document, dict):
+                # json-ld content type is returned as a raw response.
+                document = self.__json__().loads(document.content)
+            return [document]
+
+        return export.stream(bib_ids, fetch, sink, checkpoint=checkpoint,
+                             max_workers=max_workers, rate=rate,
+                             retries=retries)
@@ -4,14 +4,21 @@
 Common Client for interacting with Alma API
 """
 
-import json
+import copy
+import importlib
+import threading
 import xml.etree.ElementTree as ET
 
 import requests
 
+from . import serializers
 from . import utils
 
 
+# Held while a lazy subclient is created, so each one is only built once.
+_SUBCLIENT_LOCK = threading.RLock()
+
+
 class Client(object):
     """
     Reads responses from Alma API and handles response.
@@ -19,7 +26,36 @@ class Client(object):
 
     def __init__(self, cnxn_params={}):
         # instantiate dictionary for storing alma api connection parameters
-        self.cnxn_params = cnxn_params
+        self.cnxn_params = dict(cnxn_params)
+
+    def __lazy__(self, **subclients):
+        """Registers subclients to be created on first attribute access.
+
+        Args:
+            **subclients: Attribute names mapped to a subclient class, or to
+                a 'module.Class' path within almapipy, which is only
+                imported when the subclient is first used.
+        """
+        self.__dict__.setdefault('_subclients', {}).update(subclients)
+
+    def __getattr__(self, name):
+        # Only called when regular lookup fails, i.e. for subclients not built yet.
+        subclients = self.__dict__.get('_subclients', {})
+        if name not in subclients:
+            message = "'{}' object has no attribute '{}'"
+            raise AttributeError(message.format(type(self).__name__, name))
+        with _SUBCLIENT_LOCK:
+            if name not in self.__dict__:
+                subclient = subclients[name]
+                if isinstance(subclient, str):
+                    module, class_name = subclient.rsplit('.', 1)
+                    module = importlib.import_module('.' + module, __package__)
+                    subclient = getattr(module, class_name)
+                subclient = subclient(self.cnxn_params)
+                # Connection parameters are read-only once a subclient is in use.
+                subclient.cnxn_params = utils.frozen(subclient.cnxn_params)
+                self.__dict__[name] = subclient
+        return self.__dict__[name]
 
 #    def post(self, url, data, args, object_type, raw=False):
     def Post(self, url, data, args, headers, raw=False):
@@ -63,7 +99,7 @@ class Client(object):
         if content_type == 'json':
             headers_aux['content-type'] = 'application/json'
             if type(data_aux) != str:
-                data_aux = json.dumps(data_aux)
+                data_aux = self.__json__().dumps(data_aux)
         elif content_type == 'xml':
             headers_aux['content-type'] = 'application/xml'
             if type(data_aux) == ET or type(data_aux) == ET.Element:
@@ -77,6 +113,7 @@ class Client(object):
 
         # Send request
         response = requests.post(url, data=data_aux, params=args_aux, headers=headers_aux)
+        self.__invalidate__(url)
         if raw:
             return response
 
@@ -85,7 +122,7 @@ class Client(object):
 
         return content
 
-    def Get(self, url, args, headers, raw=False):
+    def Get(self, url, args, headers={}, raw=False):
         """
         Uses requests library to make Exlibris API Get call.
         Returns data of type specified during init of base class.
@@ -111,15 +148,41 @@ class Client(object):
         # Preserve Auth and add 'User-Agent' in headers
         headers_aux['User-Agent'] = self.cnxn_params['User-Agent']
 
-        # Send request.
-        response = requests.get(url, params=args_aux, headers=headers_aux)
+        def send():
+            return requests.get(url, params=args_aux, headers=headers_aux)
 
         if raw:
-            return response
-
-        # Parse content
+            return send()
+        key = (url, tuple(sorted((str(k), str(v)) for k, v in args_aux.items())),
+               tuple(sorted(headers_aux.items())))
+
+        cache = self.cnxn_params.get('cache')
+        if cache is not None:
+            content = cache.get(url, key)
+            if content is not None:
+                return content
+            # Read before sending, so a write made meanwhile is not undone.
+            generation = cache.generation(url)
+
+        sent = []
+
+        def fetch():
+            sent.append(True)
+            return send()
+
+        # Identical calls in flight on the same connection are sent once.
+        # They share the raw response, and each caller parses its own copy.
+        single_flight = self.cnxn_params.get('single_flight')
+        if single_flight is None:
+            response = fetch()
+        else:
+            response = single_flight.do(key, fetch)
         content = self.__parse_response__(response)
 
+        # Only the caller that sent the call stores it, with the generation
+        # read before sending.
+        if cache is not None and sent:
+            cache.set(url, key, content, generation)
         return content
 
     def Put(self, url, data, headers, raw=False):
@@ -157,7 +220,7 @@ class Client(object):
         if content_type == 'json':
             headers_aux['content-type'] = 'application/json'
             if type(data_aux) != str:
-                data_aux = json.dumps(data_aux)
+                data_aux = self.__json__().dumps(data_aux)
         elif content_type == 'xml':
             headers_aux['content-type'] = 'application/xml'
             if type(data_aux) == ET or type(data_aux) == ET.Element:
@@ -171,6 +234,7 @@ class Client(object):
 
         # Send request
         response = requests.put(url, data=data_aux, headers=headers_aux)
+        self.__invalidate__(url)
 
         if raw:
             return response
@@ -216,6 +280,7 @@ class Client(object):
 
         # Send request
         response = requests.delete(url, params=args_aux, headers=headers_aux)
+        self.__invalidate__(url)
 
         if raw:
             return response
@@ -229,6 +294,16 @@ class Client(object):
         """
         return response
 
+    def __json__(self):
+        """Returns the json backend of the connection."""
+        return self.cnxn_params.get('json_backend', serializers.DEFAULT)
+
+    def __invalidate__(self, url):
+        """Evicts cached GET responses made stale by a write to url."""
+        cache = self.cnxn_params.get('cache')
+        if cache is not None:
+            cache.invalidate(url)
+
     def __format_query__(self, query):
         """Converts dictionary of brief search query to a formated string.
         https://developers.exlibrisgroup.com/blog/How-we-re-building-APIs-at-Ex-Libris#BriefSearch
@@ -254,7 +329,8 @@ class Client(object):
 
         return q_str
 
-    def __Get_all__(self, url, args, headers, raw, response, data_key, max_limit=100):
+    def __Get_all__(self, url, args, headers={}, raw=False, response=None, data_key=None,
+                    max_limit=100):
         """Makes multiple API calls until all records for a query are retrieved.
             Called by the 'all_records' parameter.
 
@@ -271,10 +347,15 @@ class Client(object):
         Returns:
             response with remainder of data appended.
             """
+        # Work on a copy, so the caller's arguments are left untouched.
+        args = args.copy()
+
         # raw will return a list of responses
         if raw:
             responses = [response]
-            response = response.json()
+            response = self.__json__().loads(response.content)
+        if isinstance(response, LazyResponse):
+            response = response.content
 
         args['offset'] = args['limit']
         limit = args['limit']
@@ -301,7 +382,9 @@ class Client(object):
                 break
 
             # make call and increment counter variables
-            new_response = self.get(url, args=args, headers=headers_aux, raw=raw)
+            new_response = self.Get(url, args=args, headers=headers_aux, raw=raw)
+            if isinstance(new_response, LazyResponse):
+                new_response = new_response.content
             records_retrieved += limit
             args['offset'] += limit
 
@@ -319,9 +402,39 @@ class Client(object):
 
         return response
 
+
+    def read(self, url, args, raw=False):
+        """Get call for APIs that pass the api key as the 'apikey' argument.
+
+        Args:
+            url (str): Exlibris API endpoint url.
+            args (dict): Query string parameters for API call, with 'apikey'.
+            raw (bool): If true, returns raw response.
+
+        Returns:
+            JSON-esque, xml, or raw response.
+        """
+        return self.Get(url, args=args, raw=raw)
+
+    # Older name of read(), still used by some APIs.
+    get = read
+
+    def __read_all__(self, url, args, raw, response, data_key, headers={}, max_limit=100):
+        """Retrieves the remaining records of a read() call. See __Get_all__."""
+        return self.__Get_all__(url=url, args=args, headers=headers, raw=raw,
+                                response=response, data_key=data_key, max_limit=max_limit)
+
+    # Older name of __read_all__(), still used by some APIs.
+    __get_all__ = __read_all__
+
     def __parse_response__(self, response):
         """Parses alma response depending on content type.
 
+        The status code is checked before the body is parsed, and only
+        error bodies are parsed right away, to build the error message.
+        With the 'lazy' connection setting, json and xml bodies are returned
+        as a LazyResponse parsed on first access.
+
         Args:
             response: requests object from Alma.
 
@@ -338,49 +451,186 @@ class Client(object):
             message = 'Error ' + str(status) + response.text
             raise utils.AlmaError(message, status, url)
 
+        # Received response from ex libris, but error retrieving data.
+        if str(status)[0] in ['4', '5']:
+            message = self.__error_message__(response, response_type)
+            raise utils.AlmaError(message, status, url)
+
+        if response_type not in ['application/xml', 'application/json']:
+            return response
+        if self.cnxn_params.get('lazy'):
+            return LazyResponse(response, response_type, self.__json__())
+        if response_type == 'application/xml':
+            return ET.fromstring(response.content)
+        return self.__json__().loads(response.content)
+
+    def __error_message__(self, response, response_type):
+        """Builds the message of an error response from its first error."""
+        status = response.status_code
+
         # decode response if xml.
         if response_type == 'application/xml':
             xml_ns = self.cnxn_params['xml_ns']  # xml namespace
-            content = ET.fromstring(response.text)
-
-            # Received response from ex libris, but error retrieving data.
-            if str(status)[0] in ['4', '5']:
-                try:
-                    first_error = content.find("header:errorList", xml_ns)[0]
-                    message = first_error.find("header:errorCode", xml_ns).text
-                    message += " - "
-                    message += first_error.find("header:errorMessage", xml_ns).text
-                    message += " See Alma documentation for more information."
-                except:
-                    message = 'Error ' + str(status) + " - " + str(content)
-                raise utils.AlmaError(message, status, url)
+            try:
+                content = ET.fromstring(response.content)
+            except ET.ParseError:
+                return 'Error ' + str(status) + " - " + response.text
+            try:
+                first_error = content.find("header:errorList", xml_ns)[0]
+                message = first_error.find("header:errorCode", xml_ns).text
+                message += " - "
+                message += first_error.find("header:errorMessage", xml_ns).text
+                message += " See Alma documentation for more information."
+            except:
+                message = 'Error ' + str(status) + " - " + str(content)
+            return message
 
         # decode response if json.
-        elif response_type == 'application/json':
-            content = response.json()
-
-            # Received response from ex libris, but error retrieving data.
-            if str(status)[0] in ['4', '5']:
-                try:
-                    if 'web_service_result' in content.keys():
-                        first_error = content['web_service_result']['errorList']['error'][0]
+        if response_type == 'application/json':
+            try:
+                content = self.__json__().loads(response.content)
+            except ValueError:
+                return 'Error ' + str(status) + " - " + response.text
+            try:
+                if 'web_service_result' in content.keys():
+                    first_error = content['web_service_result']['errorList']['error'][0]
+                else:
+                    first_error = content['errorList']['error'][0]
+                message = first_error['errorCode']
+                message += " - "
+                message += first_error['errorMessage']
+                if 'trackingID' in first_error.keys():
+                    message += " TrackingID: " + first_error['trackingID']
+                message += " See Alma documentation for more information."
+            except:
+                message = 'Error ' + str(status) + " - " + str(content)
+            return message
+
+        return str(status) + " - " + str(response.text)
+
+
+class LazyResponse(object):
+    """
+    Successful Alma response whose body is parsed on first access.
+
+    Status, url and content type are available without parsing. Fields are
+    read with get() or [], and 'content' holds the fully parsed body, the
+    json-like dict or ElementTree returned when 'lazy' is off.
+    For xml, get() reads a root attribute such as total_record_count, or
+    the text of a top level element such as mms_id, parsing the body only
+    as far as needed. json has no such partial read: the first get() parses
+    the whole body, like content, so lazy json only saves the parsing of
+    responses that are never read.
+
+    Args:
+        response: requests object from Alma.
+        content_type (str): 'application/json' or 'application/xml'.
+        json_backend: Backend used to decode json, see serializers.
+    """
+
+    # Bytes fed to the xml parser at a time when looking for a field.
+    chunk_size = 16384
+
+    def __init__(self, response, content_type, json_backend):
+        self.response = response
+        self.status = response.status_code
+        self.url = response.url
+        self.content_type = content_type
+        self._json_backend = json_backend
+        self._content = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_xml(self):
+        return self.content_type == 'application/xml'
+
+    @property
+    def content(self):
+        """Fully parsed body."""
+        if self._content is None:
+            with self._lock:
+                if self._content is None:
+                    if self.is_xml:
+                        self._content = ET.fromstring(self.response.content)
                     else:
-                        first_error = content['errorList']['error'][0]
-                    message = first_error['errorCode']
-                    message += " - "
-                    message += first_error['errorMessage']
-                    if 'trackingID' in first_error.keys():
-                        message += "TrackingID: " + message['trackingID']
-                    message += " See Alma documentation for more information."
-                except:
-                    message = 'Error ' + str(status) + " - " + str(content)
-                raise utils.AlmaError(message, status, url)
+                        self._content = self._json_backend.loads(self.response.content)
+        return self._content
 
-        else:
-            content = response
+    def get(self, key, default=None):
+        """Returns a top level field of the body.
 
-            if str(status)[0] in ['4', '5']:
-                message = str(status) + " - "
-                message += str(content.text)
-                raise utils.AlmaError(message, status, url)
-        return content
+        xml bodies are parsed up to the field, json bodies in full.
+        """
+        if not self.is_xml:
+            return self.content.get(key, default)
+        if self._content is not None:
+            return self.__xml_field__(self._content, key, default)
+
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        body = self.response.content
+        depth = 0
+        for i in range(0, len(body), self.chunk_size):
+            parser.feed(body[i:i + self.chunk_size])
+            for event, element in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    if depth == 1 and key in element.attrib:
+                        return element.attrib[key]
+                else:
+                    depth -= 1
+                    if depth == 1 and element.tag == key:
+                        return element.text
+                    if depth == 0:
+                        return default
+        return default
+
+    @staticmethod
+    def __xml_field__(root, key, default):
+        if key in root.attrib:
+            return root.attrib[key]
+        element = root.find(key)
+        if element is None:
+            return default
+        return element.text
+
+    def keys(self):
+        """Returns the names of the top level fields of the body.
+
+        For xml, the root attributes followed by the tags of its elements.
+        """
+        content = self.content
+        if not self.is_xml:
+            return list(content.keys())
+        keys = list(content.attrib)
+        for element in content:
+            if element.tag not in keys:
+                keys.append(element.tag)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            message = "LazyResponse fields are read by name, "
+            message += "use content for the parsed body."
+            raise TypeError(message)
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __deepcopy__(self, memo):
+        other = LazyResponse(self.response, self.content_type, self._json_backend)
+        if self._content is not None:
+            other._content = copy.deepcopy(self._content, memo)
+        return other
+
+    def __repr__(self):
+        return "<LazyResponse {} {}>".format(self.status, self.content_type)
+
+
+_MISSING = object()
@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from .client import Client
+import bisect
+import datetime
+import heapq
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .client import Client, LazyResponse
 from . import utils
 
 
@@ -23,14 +32,207 @@ class SubClientConfiguration(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of api
-        self.units = SubClientConfigurationUnits(self.cnxn_params)
-        self.general = SubClientConfigurationGeneral(self.cnxn_params)
-        self.jobs = SubClientConfigurationJobs(self.cnxn_params)
-        self.sets = SubClientConfigurationSets(self.cnxn_params)
-        self.deposit_profiles = SubClientConfigurationDeposit(self.cnxn_params)
-        self.import_profiles = SubClientConfigurationImport(self.cnxn_params)
-        self.reminders = SubClientConfigurationReminders(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(units=SubClientConfigurationUnits,
+                      general=SubClientConfigurationGeneral,
+                      jobs=SubClientConfigurationJobs,
+                      sets=SubClientConfigurationSets,
+                      deposit_profiles=SubClientConfigurationDeposit,
+                      import_profiles=SubClientConfigurationImport,
+                      reminders=SubClientConfigurationReminders)
+
+    def snapshot(self, code_tables=[], max_workers=8):
+        """Fetches libraries, locations, departments and code tables at once.
+
+        Locations of every library and the code tables are retrieved
+        concurrently. The result answers code lookups from memory and can be
+        saved to disk, so workers load it at startup instead of calling Alma.
+
+        Args:
+            code_tables (list): Names of the code tables to include.
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            ConfigurationSnapshot.
+        """
+        q_params = {'format': 'json'}
+
+        def fetch(task):
+            kind, name = task
+            if kind == 'libraries':
+                return self.units.read_libaries(q_params=q_params)
+            if kind == 'departments':
+                return self.units.read_departments(q_params=q_params)
+            if kind == 'locations':
+                return self.units.read_locations(name, q_params=q_params)
+            return self.general.read_code_table(name, q_params=q_params)
+
+        data = {'libraries': {}, 'locations': {}, 'departments': {}, 'code_tables': {}}
+
+        def collect(tasks):
+            for (kind, name), response, error in utils.concurrent_map(fetch, tasks, max_workers):
+                if error is not None:
+                    raise error
+                if kind == 'libraries':
+                    for library in response.get('library') or []:
+                        data['libraries'][library['code']] = library
+                elif kind == 'departments':
+                    for department in response.get('department') or []:
+                        data['departments'][department['code']] = department
+                elif kind == 'locations':
+                    data['locations'][name] = {location['code']: location
+                                               for location in response.get('location') or []}
+                else:
+                    data['code_tables'][name] = {row['code']: row.get('description')
+                                                 for row in response.get('row') or []}
+
+        collect([('libraries', None), ('departments', None)]
+                + [('code_table', name) for name in code_tables])
+        collect([('locations', code) for code in data['libraries']])
+
+        return ConfigurationSnapshot(data)
+
+    def snapshot_profiles(self, directory, max_workers=8):
+        """Saves deposit profiles, import profiles and reminders and reports changes.
+
+        Profile lists are fetched concurrently and each entry is hashed.
+        Details are only fetched again for entries whose list-level hash
+        changed since the last run. Details are stored content-addressed in
+        directory, next to an index of their hashes.
+
+        Args:
+            directory (str): Folder of the local copy. Created if missing.
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            Dictionary of {kind: {'added': [ids], 'changed': [ids], 'removed': [ids]}}
+                for kinds 'deposit_profiles', 'import_profiles' and 'reminders'.
+        """
+        clients = {'deposit_profiles': (self.deposit_profiles, 'deposit_profile'),
+                   'import_profiles': (self.import_profiles, 'import_profile'),
+                   'reminders': (self.reminders, 'reminder')}
+        q_params = {'format': 'json'}
+
+        objects = os.path.join(directory, 'objects')
+        os.makedirs(objects, exist_ok=True)
+        index_path = os.path.join(directory, 'index.json')
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+
+        def fetch_list(kind):
+            client, data_key = clients[kind]
+
+            def get_page(limit, offset):
+                return client.read(limit=limit, offset=offset, q_params=q_params)
+
+            return list(utils.iter_records(get_page, data_key))
+
+        def fetch_detail(task):
+            kind, profile_id = task
+            detail = clients[kind][0].read(profile_id, q_params=q_params)
+            if isinstance(detail, LazyResponse):
+                detail = detail.content
+            return detail
+
+        report = {}
+        new_index = {}
+        stale = []
+        for kind, entries, error in utils.concurrent_map(fetch_list, clients, max_workers):
+            if error is not None:
+                raise error
+            old = index.get(kind, {})
+            new_index[kind] = {}
+            report[kind] = {'added': [], 'changed': [], 'removed': []}
+            for entry in entries:
+                profile_id = str(entry['id'])
+                list_hash = utils.content_hash(entry)
+                if old.get(profile_id, {}).get('list_hash') == list_hash:
+                    new_index[kind][profile_id] = old[profile_id]
+                else:
+                    new_index[kind][profile_id] = {'list_hash': list_hash}
+                    stale.append((kind, profile_id))
+            report[kind]['removed'] = sorted(set(old) - set(new_index[kind]))
+
+        for (kind, profile_id), detail, error in utils.concurrent_map(fetch_detail, stale, max_workers):
+            if error is not None:
+                raise error
+            detail_hash = utils.content_hash(detail)
+            path = os.path.join(objects, detail_hash + '.json')
+            if not os.path.exists(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(detail, f, ensure_ascii=False, sort_keys=True)
+            previous = index.get(kind, {}).get(profile_id)
+            if previous is None:
+                report[kind]['added'].append(profile_id)
+            elif previous.get('hash') != detail_hash:
+                report[kind]['changed'].append(profile_id)
+            new_index[kind][profile_id]['hash'] = detail_hash
+
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump(new_index, f, indent=1, sort_keys=True)
+
+        for kind in report:
+            report[kind]['added'].sort()
+            report[kind]['changed'].sort()
+        return report
+
+
+class ConfigurationSnapshot(object):
+    """
+    In-memory copy of the institution's configuration, indexed by code.
+
+    Built by SubClientConfiguration.snapshot(), or loaded from a file written
+    by save().
+
+    Attributes:
+        libraries (dict): {library_code: library}.
+        locations (dict): {library_code: {location_code: location}}.
+        departments (dict): {department_code: department}.
+        code_tables (dict): {table_name: {code: description}}.
+    """
+
+    def __init__(self, data):
+        self.libraries = data['libraries']
+        self.locations = data['locations']
+        self.departments = data['departments']
+        self.code_tables = data['code_tables']
+
+    def library_name(self, library_code, default=None):
+        """Returns the name of a library."""
+        library = self.libraries.get(library_code)
+        if library is None:
+            return default
+        return library.get('name', default)
+
+    def location_name(self, library_code, location_code, default=None):
+        """Returns the name of a location of a library."""
+        location = self.locations.get(library_code, {}).get(location_code)
+        if location is None:
+            return default
+        return location.get('name', default)
+
+    def describe(self, table_name, code, default=None):
+        """Returns the description of a code in a code table."""
+        return self.code_tables.get(table_name, {}).get(code, default)
+
+    def to_dict(self):
+        return {'libraries': self.libraries,
+                'locations': self.locations,
+                'departments': self.departments,
+                'code_tables': self.code_tables}
+
+    def save(self, path):
+        """Writes the snapshot to a json file."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        """Reads a snapshot written by save()."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
 
 
 class SubClientConfigurationUnits(Client):
@@ -165,6 +367,27 @@ class SubClientConfigurationGeneral(Client):
         response = self.get(url, args, raw=raw)
         return response
 
+    def open_hours(self, library_ids=[None], days=90, refresh_interval=None,
+                   max_workers=8):
+        """Returns an OpenHours service answering open-hours queries locally.
+
+        Args:
+            library_ids (list): Codes of the libraries (libraryCode) to load.
+                None stands for the institution's hours.
+            days (int): Number of days ahead to load, starting today.
+            refresh_interval (float): Seconds between background refreshes.
+                Calendars are loaded once if not specified.
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            OpenHours.
+        """
+        service = OpenHours(self, library_ids, days=days, max_workers=max_workers)
+        service.refresh()
+        if refresh_interval:
+            service.start(refresh_interval)
+        return service
+
     def read_code_table(self, table_name, q_params={}, raw=False):
         """This API returns all rows defined for a code-table.
 
@@ -192,6 +415,141 @@ class SubClientConfigurationGeneral(Client):
         return response
 
 
+class OpenHours(object):
+    """
+    Cached open-hours calendars with an interval index per library.
+
+    Calendars are fetched with SubClientConfigurationGeneral.read_hours()
+    in windows of 28 days, since the API is limited to about a month per
+    request. Queries take naive datetimes in the library's local time.
+
+    Args:
+        general (SubClientConfigurationGeneral): Client used to fetch hours.
+        library_ids (list): Codes of the libraries to load.
+            None stands for the institution's hours.
+        days (int): Number of days ahead to load, starting today.
+        max_workers (int): Number of calls made at the same time.
+    """
+
+    WINDOW = 28
+
+    def __init__(self, general, library_ids=[None], days=90, max_workers=8):
+        self.general = general
+        self.library_ids = list(library_ids)
+        self.days = days
+        self.max_workers = max_workers
+        self.refreshed = None
+        self._index = {}
+        self._refresher = None
+
+    def refresh(self):
+        """Fetches all calendars again and swaps in the new index."""
+        today = datetime.date.today()
+        windows = []
+        for library_id in self.library_ids:
+            for start in range(0, self.days, self.WINDOW):
+                first = today + datetime.timedelta(days=start)
+                last = today + datetime.timedelta(days=min(start + self.WINDOW, self.days) - 1)
+                windows.append((library_id, first.isoformat(), last.isoformat()))
+
+        def fetch(window):
+            library_id, first, last = window
+            q_params = {'format': 'json', 'from': first, 'to': last}
+            return self.general.read_hours(library_id, q_params=q_params)
+
+        intervals = {library_id: [] for library_id in self.library_ids}
+        for window, response, error in utils.concurrent_map(fetch, windows, self.max_workers):
+            if error is not None:
+                raise error
+            intervals[window[0]] += self.__intervals__(response)
+
+        index = {}
+        for library_id, spans in intervals.items():
+            spans.sort()
+            index[library_id] = ([span[0] for span in spans], spans)
+        self._index = index
+        self.refreshed = datetime.datetime.now()
+
+    def __intervals__(self, response):
+        """Converts a read_hours() response to (open, close) datetimes."""
+        spans = []
+        for day in response.get('day') or []:
+            date = datetime.datetime.strptime(day['date'].rstrip('Z')[:10], '%Y-%m-%d')
+            for hour in day.get('hour') or []:
+                opens = date + self.__time__(hour['from'])
+                closes = date + self.__time__(hour['to'])
+                if closes <= opens:
+                    closes += datetime.timedelta(days=1)
+                spans.append((opens, closes))
+        return spans
+
+    def __time__(self, value):
+        hours, minutes = value.split(':')[:2]
+        return datetime.timedelta(hours=int(hours), minutes=int(minutes))
+
+    def __spans__(self, library_id):
+        if library_id not in self._index:
+            message = "Hours of library {} are not loaded.".format(library_id)
+            raise utils.ArgError(message)
+        return self._index[library_id]
+
+    def is_open(self, library_id, when):
+        """True if the library is open at the given datetime."""
+        starts, spans = self.__spans__(library_id)
+        i = bisect.bisect_right(starts, when) - 1
+        while i >= 0:
+            if spans[i][1] > when:
+                return True
+            # Earlier spans may still overlap if a library has long shifts.
+            if spans[i][0] < when - datetime.timedelta(days=1):
+                break
+            i -= 1
+        return False
+
+    def next_open(self, library_id, when):
+        """Returns the datetime the library is next open from when on.
+
+        Returns when itself if the library is open, or None if it does not
+        open again within the loaded calendar.
+        """
+        if self.is_open(library_id, when):
+            return when
+        starts, spans = self.__spans__(library_id)
+        i = bisect.bisect_right(starts, when)
+        if i < len(starts):
+            return starts[i]
+        return None
+
+    def hours_between(self, library_id, start, end):
+        """Returns the open time between two datetimes as a timedelta."""
+        starts, spans = self.__spans__(library_id)
+        total = datetime.timedelta(0)
+        covered = start
+        i = max(bisect.bisect_right(starts, start) - 1, 0)
+        while i < len(spans) and spans[i][0] < end:
+            opens = max(spans[i][0], covered)
+            closes = min(spans[i][1], end)
+            if closes > opens:
+                total += closes - opens
+                covered = closes
+            i += 1
+        return total
+
+    def start(self, interval):
+        """Refreshes the calendars every interval seconds in the background.
+
+        If a refresh fails, the previous calendars are kept until the next one.
+        """
+        self.stop()
+        self._refresher = utils.Periodic(self.refresh, interval)
+        self._refresher.start()
+
+    def stop(self):
+        """Stops background refreshes."""
+        if self._refresher is not None:
+            self._refresher.stop()
+
+
 class SubClientConfigurationJobs(Client):
     """Handles the Jobs endpoints of Configurations API"""
 
@@ -296,6 +654,176 @@ class SubClientConfigurationJobs(Client):
                                          response=response, data_key='job_instance')
         return response
 
+    def submit(self, job_id, job_data={}, raw=False):
+        """Runs a job.
+
+        Args:
+            job_id (str): Unique id of the job.
+            job_data (dict): Job object with the parameters of the run.
+                Empty for jobs that take no parameters.
+            raw (bool): If true, returns raw requests object.
+
+        Returns:
+            Job object, with a link to the new job instance in 'additional_info'.
+                See instance_id() to extract the instance id.
+
+        """
+        headers = {'Authorization': 'apikey {}'.format(self.cnxn_params['api_key'])}
+
+        url = self.cnxn_params['api_uri_full']
+        url += ("/" + str(job_id))
+
+        args = {'op': 'run'}
+
+        return self.Post(url, data=job_data, args=args, headers=headers, raw=raw)
+
+    def instance_id(self, response):
+        """Extracts the job instance id from the response of submit()."""
+        try:
+            link = response['additional_info']['link']
+        except (KeyError, TypeError):
+            message = "Response does not link to a job instance."
+            raise utils.ArgError(message)
+        return link.rstrip('/').split('/')[-1]
+
+    def monitor(self, min_interval=2, max_interval=300):
+        """Returns a JobMonitor polling instances through this client.
+
+        Args:
+            min_interval (float): Shortest time between two polls of an instance.
+            max_interval (float): Longest time between two polls of an instance.
+        """
+        return JobMonitor(self, min_interval=min_interval, max_interval=max_interval)
+
+    def run(self, job_id, job_data={}, callback=None, monitor=None):
+        """Submits a job and watches its instance until it ends.
+
+        Args:
+            job_id (str): Unique id of the job.
+            job_data (dict): Job object with the parameters of the run.
+            callback (callable): Called with the final job instance.
+            monitor (JobMonitor): Monitor to watch the instance with.
+                A new one is started if not specified.
+
+        Returns:
+            concurrent.futures.Future resolving to the final job instance.
+        """
+        if monitor is None:
+            monitor = self.monitor()
+        instance_id = self.instance_id(self.submit(job_id, job_data))
+        return monitor.watch(job_id, instance_id, callback=callback)
+
+
+class JobMonitor(object):
+    """
+    Watches many job instances from a single scheduler thread.
+
+    Each instance is polled on its own adaptive interval: the next poll is
+    planned for half the remaining time estimated from the progress made
+    since the last poll, and the interval doubles while progress stalls.
+    Throttling, server and network errors (see utils.is_retryable) also
+    double the interval; other errors fail the watch.
+
+    watch() returns a concurrent.futures.Future, which can be awaited in
+    asyncio code with asyncio.wrap_future().
+
+    Args:
+        jobs (SubClientConfigurationJobs): Client used to poll instances.
+        min_interval (float): Shortest time between two polls of an instance.
+        max_interval (float): Longest time between two polls of an instance.
+    """
+
+    RUNNING = ['INITIALIZING', 'QUEUED', 'PENDING', 'RUNNING', 'FINALIZING']
+
+    def __init__(self, jobs, min_interval=2, max_interval=300):
+        self.jobs = jobs
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._watches = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def watch(self, job_id, instance_id, callback=None):
+        """Starts watching a job instance.
+
+        Args:
+            job_id (str): Unique id of the job.
+            instance_id (str): Unique id of the specific job instance.
+            callback (callable): Called with the final job instance.
+
+        Returns:
+            concurrent.futures.Future resolving to the final job instance.
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(
+                lambda f: f.exception() is None and callback(f.result()))
+        entry = {'job_id': job_id, 'instance_id': instance_id, 'future': future,
+                 'due': time.monotonic(), 'interval': self.min_interval,
+                 'progress': None, 'polled': None}
+        with self._cond:
+            heapq.heappush(self._watches, (entry['due'], id(entry), entry))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.__loop__, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def __len__(self):
+        with self._cond:
+            return len(self._watches)
+
+    def __loop__(self):
+        while True:
+            with self._cond:
+                if not self._watches:
+                    self._thread = None
+                    return
+                due, _, entry = self._watches[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._watches)
+
+            if self.__poll__(entry):
+                with self._cond:
+                    heapq.heappush(self._watches, (entry['due'], id(entry), entry))
+
+    def __poll__(self, entry):
+        """Polls an instance. Returns True if it must be polled again."""
+        try:
+            instance = self.jobs.read_instances(entry['job_id'], entry['instance_id'],
+                                                q_params={'format': 'json'})
+        except Exception as e:
+            if not utils.is_retryable(e):
+                entry['future'].set_exception(e)
+                return False
+            # Throttled or temporary failure: the job is still running,
+            # so poll again after backing off.
+            entry['interval'] = min(entry['interval'] * 2, self.max_interval)
+            entry['due'] = time.monotonic() + entry['interval']
+            return True
+
+        status = instance.get('status', {}).get('value')
+        if status not in self.RUNNING:
+            entry['future'].set_result(instance)
+            return False
+
+        now = time.monotonic()
+        progress = float(instance.get('progress') or 0)
+        interval = entry['interval'] * 2
+        if entry['progress'] is not None and progress > entry['progress']:
+            rate = (progress - entry['progress']) / (now - entry['polled'])
+            interval = (100 - progress) / rate / 2
+        interval = min(max(interval, self.min_interval), self.max_interval)
+
+        entry['interval'] = interval
+        entry['progress'] = progress
+        entry['polled'] = now
+        entry['due'] = now + interval
+        return True
+
 
 class SubClientConfigurationSets(Client):
     """Handles the Sets endpoints of Configurations API
@@ -407,6 +935,56 @@ class SubClientConfigurationSets(Client):
                                          response=response, data_key='member')
         return response
 
+    def materialize(self, set_id, max_workers=8):
+        """Yields the full records of the members of a Set.
+
+        Members are read page by page, and their records are fetched
+        concurrently as soon as each page arrives, so output starts before
+        the whole member list is downloaded. Bib sets are retrieved 100 bibs
+        per call; other content types follow the link of each member.
+
+        Args:
+            set_id (str): A unique identifier of the set.
+            max_workers (int): Number of calls made at the same time.
+
+        Yields:
+            Full json records (bib, item, user, ...), in order of arrival.
+        """
+        headers = {'Authorization': 'apikey {}'.format(self.cnxn_params['api_key'])}
+        args = {'format': 'json'}
+
+        set_info = self.read(set_id, q_params=args)
+        content_type = set_info['content']['value']
+
+        def get_page(limit, offset):
+            return self.read_members(set_id, limit=limit, offset=offset, q_params=args)
+
+        members = utils.iter_records(get_page, 'member')
+
+        if content_type == 'BIB_MMS':
+            url = self.cnxn_params['base_uri'] + "/almaws/v1/bibs"
+
+            def fetch(chunk):
+                bib_args = args.copy()
+                bib_args['mms_id'] = ",".join(member['id'] for member in chunk)
+                return self.Get(url, args=bib_args, headers=headers)['bib']
+
+            tasks = utils.chunked(members, 100)
+        else:
+            def fetch(member):
+                record = self.Get(member['link'], args=args, headers=headers)
+                if isinstance(record, LazyResponse):
+                    record = record.content
+                return [record]
+
+            tasks = members
+
+        for task, records, error in utils.concurrent_map(fetch, tasks, max_workers):
+            if error is not None:
+                raise error
+            for record in records:
+                yield record
+
 
 class SubClientConfigurationDeposit(Client):
     """Handles the Deposit profiles endpoints of Configurations API"""
@@ -459,6 +1037,7 @@ class SubClientConfigurationDeposit(Client):
         if all_records:
             response = self.__get_all__(url=url, args=args, raw=raw,
                                          response=response, data_key='deposit_profile')
+        return response
 
 
 class SubClientConfigurationImport(Client):
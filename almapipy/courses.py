@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from .client import Client
+from . import export
 from . import utils
 
 
@@ -23,11 +24,11 @@ class SubClientCourses(Client):
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
         #self.cnxn_params['xml_ns']['report'] = 'urn:schemas-microsoft-com:xml-analysis:rowset'
 
-        # Hook in subclients of api
-        self.reading_lists = SubClientCoursesReadingLists(self.cnxn_params)
-        self.citations = SubClientCoursesCitations(self.cnxn_params)
-        self.owners = SubClientCoursesOwners(self.cnxn_params)
-        self.tags = SubClientCoursesTags(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(reading_lists=SubClientCoursesReadingLists,
+                      citations=SubClientCoursesCitations,
+                      owners=SubClientCoursesOwners,
+                      tags=SubClientCoursesTags)
 
     def get(self, course_id=None, query={}, limit=10, offset=0,
             all_records=False, q_params={}, raw=False):
@@ -85,6 +86,85 @@ class SubClientCourses(Client):
                                          response=response, data_key='course')
         return response
 
+    def export_reading_lists(self, sink, query={}, checkpoint=None, max_workers=8):
+        """Exports courses, reading lists, owners, citations and tags as flat rows.
+
+        The course -> reading list -> citation tree is walked breadth-first
+        over a worker pool, and one row per citation is written to the sink:
+        {'course_id', 'course_code', 'course_name', 'reading_list_id',
+         'reading_list_name', 'owners', 'citation_id', 'citation_title',
+         'citation_status', 'tags'}
+        Courses and reading lists without citations give one row with the
+        missing fields set to None.
+
+        Courses are checkpointed with their last modification date, so a
+        rerun resumes after an interruption and skips courses that did not
+        change since they were exported.
+
+        Args:
+            sink: Object with write(row) and flush(), e.g. export.NDJSONSink.
+            query (dict): Search query for filtering courses. See get().
+            checkpoint (export.Checkpoint): Tracks exported courses.
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            Dictionary of export statistics. See export.crawl().
+        """
+        q_params = {'format': 'json'}
+
+        def get_page(limit, offset):
+            return self.get(query=query, limit=limit, offset=offset, q_params=q_params)
+
+        def course_key(course):
+            return "{}@{}".format(course['id'], course.get('last_modified_date', ''))
+
+        def row(course, reading_list=None, owners=None, citation=None, tags=None):
+            reading_list = reading_list or {}
+            citation = citation or {}
+            metadata = citation.get('metadata') or {}
+            return {'course_id': course['id'],
+                    'course_code': course.get('code'),
+                    'course_name': course.get('name'),
+                    'reading_list_id': reading_list.get('id'),
+                    'reading_list_name': reading_list.get('name'),
+                    'owners': owners,
+                    'citation_id': citation.get('id'),
+                    'citation_title': metadata.get('title'),
+                    'citation_status': (citation.get('status') or {}).get('value'),
+                    'tags': tags}
+
+        def expand(node):
+            level, course = node[0], node[1]
+            if level == 'course':
+                lists = self.reading_lists.get(course['id'], q_params=q_params)
+                lists = lists.get('reading_list') or []
+                if not lists:
+                    return [], [row(course)]
+                return [('list', course, reading_list) for reading_list in lists], []
+
+            if level == 'list':
+                reading_list = node[2]
+                owners = self.owners.get(course['id'], reading_list['id'], q_params=q_params)
+                owners = [owner.get('primary_id') for owner in owners.get('owner') or []]
+                citations = self.citations.get(course['id'], reading_list['id'],
+                                               q_params=q_params)
+                citations = citations.get('citation') or []
+                if not citations:
+                    return [], [row(course, reading_list, owners)]
+                return [('citation', course, reading_list, owners, citation)
+                        for citation in citations], []
+
+            reading_list, owners, citation = node[2:]
+            tags = self.tags.get(course['id'], reading_list['id'], citation['id'],
+                                 q_params=q_params)
+            tags = [tag.get('value') for tag in tags.get('tag') or []]
+            return [], [row(course, reading_list, owners, citation, tags)]
+
+        courses = (('course', course) for course in utils.iter_records(get_page, 'course'))
+        return export.crawl(courses, expand, sink, checkpoint=checkpoint,
+                            key=lambda node: course_key(node[1]),
+                            max_workers=max_workers)
+
 
 class SubClientCoursesReadingLists(Client):
     """Handles the reading list endpoints of Courses API"""
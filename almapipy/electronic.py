@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from .client import Client
+from . import export
 from . import utils
 
 
@@ -23,10 +24,71 @@ class SubClientElectronic(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of api
-        self.collections = SubClientElectronicCollections(self.cnxn_params)
-        self.services = SubClientElectronicServices(self.cnxn_params)
-        self.portfolios = SubClientElectronicPortfolios(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(collections=SubClientElectronicCollections,
+                      services=SubClientElectronicServices,
+                      portfolios=SubClientElectronicPortfolios)
+
+    def export_portfolios(self, sink, query={}, checkpoint=None, max_workers=8,
+                          progress=None):
+        """Exports every portfolio with its collection and service context.
+
+        Collections, their services and the pages of each service's
+        portfolio list are fetched concurrently over one worker pool.
+        One flat row per portfolio is written to the sink: the portfolio
+        record plus 'collection_id', 'collection_name', 'service_id' and
+        'service_name'.
+
+        Args:
+            sink: Object with write(row) and flush(), e.g. export.NDJSONSink.
+            query (dict): Search query for filtering collections. See collections.get().
+            checkpoint (export.Checkpoint): Tracks exported collections.
+                Collections already in it are skipped, so a rerun resumes.
+            max_workers (int): Number of calls made at the same time.
+            progress (callable): Called with export statistics, including
+                'rows_per_second', after each flush. E.g. print.
+
+        Returns:
+            Dictionary of export statistics. See export.crawl().
+        """
+        limit = 100
+
+        def get_page(limit, offset):
+            return self.collections.get(query=query, limit=limit, offset=offset,
+                                        q_params={'format': 'json'})
+
+        def expand(node):
+            level, collection = node[0], node[1]
+            if level == 'collection':
+                services = self.services.get(collection['id'], q_params={'format': 'json'})
+                return [('page', collection, service, 0)
+                        for service in services.get('electronic_service') or []], []
+
+            service, offset = node[2:]
+            q_params = {'format': 'json', 'limit': limit, 'offset': offset}
+            response = self.portfolios.get(collection['id'], service['id'], q_params=q_params)
+            rows = []
+            for portfolio in response.get('portfolio') or []:
+                row = dict(portfolio)
+                row['collection_id'] = collection['id']
+                row['collection_name'] = collection.get('public_name')
+                row['service_id'] = service['id']
+                row['service_name'] = service.get('public_name')
+                rows.append(row)
+
+            # The first page tells how many pages are left to fan out.
+            children = []
+            if offset == 0:
+                total = int(response.get('total_record_count', 0))
+                children = [('page', collection, service, next_offset)
+                            for next_offset in range(limit, total, limit)]
+            return children, rows
+
+        collections = (('collection', collection)
+                       for collection in utils.iter_records(get_page, 'electronic_collection'))
+        return export.crawl(collections, expand, sink, checkpoint=checkpoint,
+                            key=lambda node: node[1]['id'],
+                            max_workers=max_workers, progress=progress)
 
 
 class SubClientElectronicCollections(Client):
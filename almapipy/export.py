@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming sinks and resumable progress tracking for bulk exports
+"""
+
+import collections
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from . import utils
+
+
+class NDJSONSink(object):
+    """
+    Writes one json document per line, optionally gzip compressed.
+    Appends to an existing file so an interrupted export can be resumed.
+
+    Args:
+        path (str): Output file. Compressed if it ends with '.gz'.
+        append (bool): Append to the file instead of truncating it.
+    """
+
+    def __init__(self, path, append=True):
+        self.path = path
+        mode = 'at' if append else 'wt'
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, mode, encoding='utf-8')
+        else:
+            self._file = open(path, mode, encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CSVSink(object):
+    """
+    Writes rows as a table with a fixed set of columns.
+    Nested values are stored as json, and missing ones as empty cells.
+
+    Args:
+        path (str): Output file. Compressed if it ends with '.gz'.
+        columns (list): Column names, in order.
+        append (bool): Append to the file instead of truncating it.
+            The header is only written to new files.
+    """
+
+    def __init__(self, path, columns, append=True):
+        self.path = path
+        self.columns = list(columns)
+        new_file = not (append and os.path.exists(path) and os.path.getsize(path))
+        mode = 'at' if append else 'wt'
+        if path.endswith('.gz'):
+            self._file = gzip.open(path, mode, encoding='utf-8', newline='')
+        else:
+            self._file = open(path, mode, encoding='utf-8', newline='')
+        self._writer = csv.writer(self._file)
+        self._lock = threading.Lock()
+        if new_file:
+            self._writer.writerow(self.columns)
+
+    def write(self, record):
+        values = []
+        for column in self.columns:
+            value = record.get(column)
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value, ensure_ascii=False)
+            values.append('' if value is None else value)
+        with self._lock:
+            self._writer.writerow(values)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UniqueSink(object):
+    """
+    Drops rows whose key was already written, then passes them to a sink.
+
+    With a checkpoint, the key of every written row is also added to it,
+    prefixed with 'row:', so a resumed export drops the rows written by
+    the previous runs too.
+
+    Args:
+        sink: Object with write(row) and flush().
+        key (callable): Returns the identity of a row.
+        checkpoint (Checkpoint): Keeps the keys of written rows between runs.
+    """
+
+    def __init__(self, sink, key, checkpoint=None):
+        self.sink = sink
+        self.key = key
+        self.checkpoint = checkpoint
+        self.seen = set()
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        """Writes a row unless its key was seen. Returns False for duplicates."""
+        row_key = self.key(record)
+        with self._lock:
+            if row_key in self.seen or (self.checkpoint is not None
+                                        and 'row:' + str(row_key) in self.checkpoint):
+                self.duplicates += 1
+                return False
+            self.seen.add(row_key)
+        self.sink.write(record)
+        if self.checkpoint is not None:
+            self.checkpoint.add('row:' + str(row_key))
+        return True
+
+    def flush(self):
+        self.sink.flush()
+
+
+class Checkpoint(object):
+    """
+    Append-only file of completed keys.
+
+    Keys are buffered by add() and only written by flush(), which exports
+    call right after flushing their sink. A crash can therefore repeat the
+    records written since the last flush, but never lose them.
+
+    Args:
+        path (str): Progress file. Created if it does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.done = set(line.rstrip('\n') for line in f if line.strip())
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return str(key) in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, key):
+        key = str(key)
+        with self._lock:
+            if key not in self.done:
+                self.done.add(key)
+                self._pending.append(key)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(self._pending) + '\n')
+            self._pending = []
+
+
+class JSONLDChunkSink(object):
+    """
+    Writes json-ld documents in numbered chunk files of {"@graph": [...]}.
+
+    The open chunk is written to a '.part' file, one document per line,
+    and each flush only appends the documents written since the last one.
+    Once it holds chunk_size documents, or the sink is closed, the chunk is
+    completed and renamed to its final name. Existing chunks are never
+    overwritten, so a resumed export continues with a new chunk number.
+    A '.part' file left by an interrupted export is completed with the
+    documents it holds when the sink is created.
+
+    Args:
+        prefix (str): Path prefix of the chunks, e.g. 'dump/catalog'
+            gives 'dump/catalog-00001.jsonld.gz'.
+        chunk_size (int): Documents per chunk.
+        compress (bool): Gzip the chunks.
+    """
+
+    header = '{"@graph": [\n'
+    footer = ']}\n'
+
+    def __init__(self, prefix, chunk_size=10000, compress=True):
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.chunk = 1
+        while True:
+            if os.path.exists(self.__path__() + '.part'):
+                self.__recover__()
+            if not os.path.exists(self.__path__()):
+                break
+            self.chunk += 1
+        self._docs = []
+        self._count = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __path__(self):
+        path = '{}-{:05d}.jsonld'.format(self.prefix, self.chunk)
+        if self.compress:
+            path += '.gz'
+        return path
+
+    def __open__(self, path, mode):
+        if self.compress:
+            return gzip.open(path, mode + 't', encoding='utf-8')
+        return open(path, mode, encoding='utf-8')
+
+    def __recover__(self):
+        # Keeps the complete documents of a chunk left open by a crash.
+        part_path = self.__path__() + '.part'
+        with open(part_path, 'rb') as f:
+            body = f.read()
+        if self.compress:
+            # The stream was flushed but never finished, so it has no trailer.
+            body = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body)
+        lines = body.decode('utf-8', 'replace').split('\n')[1:]
+        documents = []
+        for line in lines:
+            try:
+                json.loads(line.lstrip(','))
+            except ValueError:
+                break
+            documents.append(line.lstrip(','))
+        if documents:
+            with self.__open__(part_path, 'w') as f:
+                f.write(self.header + '\n,'.join(documents) + '\n' + self.footer)
+            os.replace(part_path, self.__path__())
+        else:
+            os.remove(part_path)
+
+    def __append__(self):
+        if not self._docs:
+            return
+        if self._file is None:
+            self._file = self.__open__(self.__path__() + '.part', 'w')
+            self._file.write(self.header)
+            separator = ''
+        else:
+            separator = ','
+        lines = [json.dumps(document, ensure_ascii=False) for document in self._docs]
+        self._file.write(separator + '\n,'.join(lines) + '\n')
+        self._file.flush()
+        self._docs = []
+
+    def __complete__(self):
+        self.__append__()
+        if self._file is None:
+            return
+        self._file.write(self.footer)
+        self._file.close()
+        self._file = None
+        os.replace(self.__path__() + '.part', self.__path__())
+        self.chunk += 1
+        self._count = 0
+
+    def write(self, document):
+        with self._lock:
+            self._docs.append(document)
+            self._count += 1
+            if self._count >= self.chunk_size:
+                self.__complete__()
+
+    def flush(self):
+        with self._lock:
+            self.__append__()
+
+    def close(self):
+        with self._lock:
+            self.__complete__()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _throughput(stats, started):
+    stats['elapsed'] = time.monotonic() - started
+    stats['rows_per_second'] = stats['rows'] / max(stats['elapsed'], 1e-9)
+
+
+def _write_rows(sink, rows):
+    """Writes rows to a sink. Returns how many it kept, i.e. did not return False for."""
+    written = 0
+    for row in rows:
+        if sink.write(row) is not False:
+            written += 1
+    return written
+
+
+def _retrying(fetch, rate=None, retries=0, backoff=1.0):
+    """Wraps fetch with a shared rate limit and retries of retryable errors."""
+    limiter = utils.RateLimiter(rate) if rate else None
+
+    def attempt(item):
+        for i in range(retries + 1):
+            if limiter is not None:
+                limiter.wait()
+            try:
+                return fetch(item)
+            except Exception as e:
+                if i == retries or not utils.is_retryable(e):
+                    raise
+                time.sleep(backoff * 2 ** i)
+
+    return attempt
+
+
+def stream(items, fetch, sink, checkpoint=None, key=str, max_workers=8,
+           flush_every=100, rate=None, retries=0, backoff=1.0, progress=None):
+    """Fetches items concurrently and writes the resulting rows to a sink.
+
+    Failed items are retried by their own worker after a backoff, while the
+    other workers keep writing to the sink. Only Alma errors (utils.Error)
+    and network errors (IOError) are recorded as failures; any other
+    exception is a bug and stops the export.
+
+    Args:
+        items (iterable): Work items. Consumed lazily.
+        fetch (callable): Called with an item, returns a list of rows.
+        sink: Object with write(row) and flush(), e.g. NDJSONSink.
+        checkpoint (Checkpoint): Items already in the checkpoint are skipped,
+            and finished items are added to it.
+        key (callable): Returns the checkpoint key of an item.
+        max_workers (int): Number of items fetched at the same time.
+        flush_every (int): Number of finished items between flushes.
+        rate (float): Maximum number of fetch calls per second.
+        retries (int): Times an item is retried after a retryable error.
+            See utils.is_retryable().
+        backoff (float): Seconds before the first retry, doubled on each one.
+        progress (callable): Called with the statistics after each flush.
+
+    Returns:
+        Dictionary with counts of 'done', 'skipped' and 'rows',
+            and a 'failed' dictionary of {key: error}.
+            'rows' leaves out rows the sink dropped, see UniqueSink.
+            'elapsed' seconds and 'rows_per_second' report throughput.
+    """
+    stats = {'done': 0, 'skipped': 0, 'rows': 0, 'failed': {}}
+    started = time.monotonic()
+    attempt = _retrying(fetch, rate, retries, backoff)
+
+    def todo():
+        for item in items:
+            if checkpoint is not None and key(item) in checkpoint:
+                stats['skipped'] += 1
+                continue
+            yield item
+
+    def commit():
+        sink.flush()
+        if checkpoint is not None:
+            checkpoint.flush()
+        _throughput(stats, started)
+        if progress is not None:
+            progress(stats)
+
+    try:
+        for item, rows, error in utils.concurrent_map(attempt, todo(), max_workers):
+            if error is not None:
+                if not isinstance(error, (utils.Error, IOError)):
+                    raise error
+                stats['failed'][key(item)] = error
+                continue
+            stats['rows'] += _write_rows(sink, rows)
+            stats['done'] += 1
+            if checkpoint is not None:
+                checkpoint.add(key(item))
+            if stats['done'] % flush_every == 0:
+                commit()
+    finally:
+        commit()
+
+    return stats
+
+
+def crawl(roots, expand, sink, checkpoint=None, key=str, max_workers=8,
+          flush_every=100, rate=None, retries=0, backoff=1.0, progress=None):
+    """Walks trees of API calls breadth-first over a single worker pool.
+
+    Nodes waiting to be expanded are queued first in, first out, and new
+    roots are only read when the queue runs dry, so the trees in progress
+    are walked level by level while memory stays bounded.
+    A root is checkpointed once all of its descendants are expanded.
+    As in stream(), only utils.Error and IOError count as failures.
+
+    Args:
+        roots (iterable): Root nodes. Consumed lazily.
+        expand (callable): Called with a node, returns (children, rows).
+            children are nodes to expand next, rows are written to the sink.
+        sink: Object with write(row) and flush(), e.g. NDJSONSink.
+        checkpoint (Checkpoint): Roots already in the checkpoint are skipped,
+            and finished roots are added to it.
+        key (callable): Returns the checkpoint key of a root.
+        max_workers (int): Number of nodes expanded at the same time.
+        flush_every (int): Number of finished roots between flushes.
+        rate (float): Maximum number of expand calls per second.
+        retries (int): Times a node is retried after a retryable error.
+        backoff (float): Seconds before the first retry, doubled on each one.
+        progress (callable): Called with the statistics after each flush.
+
+    Returns:
+        Dictionary with counts of 'done', 'skipped', 'nodes' and 'rows',
+            and a 'failed' dictionary of {root key: error}.
+            'rows' leaves out rows the sink dropped, see UniqueSink.
+            'elapsed' seconds and 'rows_per_second' report throughput.
+    """
+    stats = {'done': 0, 'skipped': 0, 'nodes': 0, 'rows': 0, 'failed': {}}
+    started = time.monotonic()
+    attempt = _retrying(expand, rate, retries, backoff)
+    roots = iter(roots)
+    queue = collections.deque()
+    remaining = {}
+
+    def next_root():
+        for root in roots:
+            root_key = key(root)
+            if checkpoint is not None and root_key in checkpoint:
+                stats['skipped'] += 1
+                continue
+            remaining[root_key] = 1
+            return root_key, root
+        return None
+
+    def commit():
+        sink.flush()
+        if checkpoint is not None:
+            checkpoint.flush()
+        _throughput(stats, started)
+        if progress is not None:
+            progress(stats)
+
+    def finish(root_key):
+        remaining[root_key] -= 1
+        if remaining[root_key] > 0:
+            return
+        del remaining[root_key]
+        if root_key in stats['failed']:
+            return
+        stats['done'] += 1
+        if checkpoint is not None:
+            checkpoint.add(root_key)
+        if stats['done'] % flush_every == 0:
+            commit()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            while True:
+                while len(pending) < max_workers * 2:
+                    if not queue:
+                        task = next_root()
+                        if task is None:
+                            break
+                        queue.append(task)
+                    root_key, node = queue.popleft()
+                    if root_key in stats['failed']:
+                        finish(root_key)
+                        continue
+                    pending[executor.submit(attempt, node)] = root_key
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    root_key = pending.pop(future)
+                    stats['nodes'] += 1
+                    try:
+                        children, rows = future.result()
+                    except (utils.Error, IOError) as e:
+                        stats['failed'][root_key] = e
+                        finish(root_key)
+                        continue
+                    if root_key not in stats['failed']:
+                        stats['rows'] += _write_rows(sink, rows)
+                        for child in children:
+                            remaining[root_key] += 1
+                            queue.append((root_key, child))
+                    finish(root_key)
+    finally:
+        commit()
+
+    return stats
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact MARC records decoded from Alma bib and holding responses
+"""
+
+import sys
+import xml.etree.ElementTree as ET
+
+from .client import LazyResponse
+from . import utils
+
+
+# Subfields of a data field are packed into a single string, as in binary
+# MARC, and only split when they are accessed.
+SUBFIELD_DELIMITER = '\x1f'
+
+
+class MarcField(object):
+    """Lightweight view over one field of a MarcRecord.
+
+    Views are created on access and are not stored in the record.
+    """
+
+    __slots__ = ('tag', 'indicators', '_data')
+
+    def __init__(self, tag, indicators, data):
+        self.tag = tag
+        self.indicators = indicators
+        self._data = data
+
+    def is_control(self):
+        return self.tag < '010'
+
+    @property
+    def value(self):
+        """Content of a control field, or all subfield values joined by a space."""
+        if self.is_control():
+            return self._data
+        return " ".join(value for code, value in self.subfields)
+
+    @property
+    def subfields(self):
+        """List of (code, value) tuples. Empty for control fields."""
+        if self.is_control():
+            return []
+        return [(chunk[0], chunk[1:])
+                for chunk in self._data.split(SUBFIELD_DELIMITER) if chunk]
+
+    def get(self, code):
+        """Returns all values of a subfield code."""
+        return [value for sub_code, value in self.subfields if sub_code == code]
+
+    def __getitem__(self, code):
+        values = self.get(code)
+        if not values:
+            raise KeyError(code)
+        return values[0]
+
+    def __repr__(self):
+        if self.is_control():
+            return "<MarcField {} {!r}>".format(self.tag, self._data)
+        return "<MarcField {} {!r} {!r}>".format(self.tag, self.indicators,
+                                                 self.subfields)
+
+
+class MarcRecord(object):
+    """Compact MARC record.
+
+    Fields are stored as parallel tuples of tags, indicators and packed data,
+    so a record costs a handful of strings instead of a full element tree.
+
+    Args:
+        record_id (str): mms_id or holding_id the record was decoded from.
+        leader (str): MARC leader.
+        tags (tuple): Field tags, in record order.
+        indicators (tuple): Two-character indicators. Empty for control fields.
+        data (tuple): Control field content or packed subfields.
+    """
+
+    __slots__ = ('record_id', 'leader', 'tags', 'indicators', 'data')
+
+    def __init__(self, record_id, leader, tags, indicators, data):
+        self.record_id = record_id
+        self.leader = leader
+        self.tags = tags
+        self.indicators = indicators
+        self.data = data
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __iter__(self):
+        for i in range(len(self.tags)):
+            yield MarcField(self.tags[i], self.indicators[i], self.data[i])
+
+    def __contains__(self, tag):
+        return tag in self.tags
+
+    def get_fields(self, *tags):
+        """Returns fields with the given tags, or all fields if none are given."""
+        return [MarcField(self.tags[i], self.indicators[i], self.data[i])
+                for i in range(len(self.tags))
+                if not tags or self.tags[i] in tags]
+
+    def get_subfields(self, tag, code):
+        """Returns every value of a subfield across all fields with a tag."""
+        values = []
+        for field in self.get_fields(tag):
+            values += field.get(code)
+        return values
+
+    def get_value(self, tag, code=None, default=None):
+        """Returns the first value of a control field or subfield.
+
+        Args:
+            tag (str): MARC tag, e.g. '001' or '245'.
+            code (str): Subfield code. Ignored for control fields.
+            default: Returned when no value is found.
+        """
+        for field in self.get_fields(tag):
+            if field.is_control() or code is None:
+                return field.value
+            values = field.get(code)
+            if values:
+                return values[0]
+        return default
+
+    def __repr__(self):
+        return "<MarcRecord {} ({} fields)>".format(self.record_id, len(self))
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_record(record, record_id=None, fields=None):
+    """Builds a MarcRecord from a MARCXML <record>.
+
+    Args:
+        record (str or ET.Element): MARCXML record, as found in the 'anies'
+            list of json responses or the <record> element of xml responses.
+        record_id (str): Identifier to store in the record.
+        fields (list): Tags to keep, e.g. ['245', '020', '856'].
+            All fields are kept if not specified.
+
+    Returns:
+        MarcRecord.
+    """
+    if type(record) == str:
+        record = ET.fromstring(record)
+    elif type(record) != ET.Element:
+        message = "MARC record must be either string or ElementTree."
+        raise utils.ArgError(message)
+    if _local_name(record.tag) != 'record':
+        record = next((node for node in record.iter()
+                       if _local_name(node.tag) == 'record'), None)
+        if record is None:
+            raise utils.ArgError("No MARC record found.")
+    if fields is not None:
+        fields = set(fields)
+
+    leader = ''
+    tags = []
+    indicators = []
+    data = []
+    for node in record:
+        name = _local_name(node.tag)
+        if name == 'leader':
+            leader = node.text or ''
+            continue
+        tag = node.get('tag', '')
+        if fields is not None and tag not in fields:
+            continue
+        if name == 'controlfield':
+            ind = ''
+            value = node.text or ''
+        elif name == 'datafield':
+            ind = node.get('ind1', ' ') + node.get('ind2', ' ')
+            value = ''.join(SUBFIELD_DELIMITER + sub.get('code', ' ') + (sub.text or '')
+                            for sub in node)
+        else:
+            continue
+        tags.append(sys.intern(tag))
+        indicators.append(sys.intern(ind))
+        data.append(value)
+
+    return MarcRecord(record_id, leader, tuple(tags), tuple(indicators), tuple(data))
+
+
+def _iter_marc(response):
+    """Yields (record_id, MARCXML) pairs found in a bib or holding response."""
+    if isinstance(response, LazyResponse):
+        response = response.content
+
+    if type(response) == dict:
+        if 'bib' in response:
+            entries = response['bib'] or []
+        elif 'holding' in response:
+            entries = response['holding'] or []
+        else:
+            entries = [response]
+        for entry in entries:
+            anies = entry.get('anies') or []
+            if not anies:
+                continue
+            record_id = entry.get('mms_id') or entry.get('holding_id')
+            yield record_id, anies[0]
+
+    elif type(response) == ET.Element:
+        if response.tag in ['bibs', 'holdings']:
+            entries = list(response)
+        else:
+            entries = [response]
+        for entry in entries:
+            record = entry.find('record')
+            if record is None:
+                continue
+            record_id = entry.findtext('mms_id') or entry.findtext('holding_id')
+            yield record_id, record
+
+    else:
+        message = "Response must be either json-like dict or ElementTree."
+        raise utils.ArgError(message)
+
+
+def decode(response, fields=None):
+    """Decodes the MARC records of a bib or holding response.
+
+    Works on the output of bibs.catalog.get() and
+    bibs.catalog.get_holdings(bib_id, holding_id), in json or xml format.
+
+    Args:
+        response (dict, ET.Element or LazyResponse): Parsed Alma response.
+        fields (list): Tags to keep, e.g. ['245', '020', '856'].
+            All fields are kept if not specified.
+
+    Returns:
+        List of MarcRecord.
+    """
+    return [parse_record(record, record_id, fields)
+            for record_id, record in _iter_marc(response)]
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
-from .client import Client
+import time
+
+from .client import Client, LazyResponse
 from . import utils
 
 
@@ -23,8 +25,8 @@ class SubClientPartners(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of api
-        self.lending_requests = SubClientPartnersLending(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(lending_requests=SubClientPartnersLending)
 
     def get(self, partner_id=None, limit=10, offset=0, all_records=False,
             q_params={}, raw=False):
@@ -71,6 +73,117 @@ class SubClientPartners(Client):
                                          response=response, data_key='partner')
         return response
 
+    def directory(self, refresh_interval=None, max_workers=4):
+        """Returns a PartnerDirectory indexed by partner code.
+
+        Args:
+            refresh_interval (float): Seconds between background refreshes.
+                The directory is loaded once if not specified.
+            max_workers (int): Number of pages fetched at the same time.
+
+        Returns:
+            PartnerDirectory, already loaded.
+        """
+        directory = PartnerDirectory(self, max_workers=max_workers)
+        directory.refresh()
+        if refresh_interval:
+            directory.start(refresh_interval)
+        return directory
+
+    def get_lending_requests(self, requests, directory=None, max_workers=8):
+        """Retrieves many lending requests and joins in their partner.
+
+        Duplicate requests are fetched once, and calls are made concurrently.
+        Partners are looked up locally in the directory, which is loaded
+        once if not given.
+
+        Args:
+            requests (list): (partner_id, request_id) tuples.
+            directory (PartnerDirectory): Directory to look partners up in.
+            max_workers (int): Number of calls made at the same time.
+
+        Returns:
+            Dictionary of {(partner_id, request_id): lending request}.
+                Each request has a 'partner' key with the partner record,
+                or None if the partner is not in the directory.
+                Entries whose call failed hold the raised utils.AlmaError.
+        """
+        if directory is None:
+            directory = self.directory(max_workers=max_workers)
+
+        def fetch(task):
+            partner_id, request_id = task
+            return self.lending_requests.get(partner_id, request_id,
+                                             q_params={'format': 'json'})
+
+        keys = set((str(partner_id), str(request_id)) for partner_id, request_id in requests)
+        results = {}
+        for key, request, error in utils.concurrent_map(fetch, keys, max_workers):
+            if error is not None:
+                if not isinstance(error, utils.Error):
+                    raise error
+                results[key] = error
+                continue
+            if isinstance(request, LazyResponse):
+                request = request.content
+            request['partner'] = directory.get(key[0])
+            results[key] = request
+        return results
+
+
+class PartnerDirectory(object):
+    """
+    Resource Sharing Partners indexed by partner code, refreshed on an interval.
+
+    Args:
+        partners (SubClientPartners): Client used to fetch partners.
+        max_workers (int): Number of pages fetched at the same time.
+    """
+
+    def __init__(self, partners, max_workers=4):
+        self.partners = partners
+        self.max_workers = max_workers
+        self.index = {}
+        self.refreshed = None
+        self._refresher = None
+
+    def refresh(self):
+        """Fetches the whole directory again and swaps in the new index."""
+        def get_page(limit, offset):
+            return self.partners.get(limit=limit, offset=offset, q_params={'format': 'json'})
+
+        records = utils.fetch_pages(get_page, 'partner', max_workers=self.max_workers)
+        self.index = {partner['partner_details']['code']: partner for partner in records}
+        self.refreshed = time.time()
+
+    def get(self, code, default=None):
+        """Returns a partner by code."""
+        return self.index.get(code, default)
+
+    def name(self, code, default=None):
+        """Returns the name of a partner."""
+        partner = self.index.get(code)
+        if partner is None:
+            return default
+        return partner['partner_details'].get('name', default)
+
+    def __contains__(self, code):
+        return code in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def start(self, interval):
+        """Refreshes the directory every interval seconds in the background."""
+        self.stop()
+        self._refresher = utils.Periodic(self.refresh, interval)
+        self._refresher.start()
+
+    def stop(self):
+        """Stops background refreshes."""
+        if self._refresher is not None:
+            self._refresher.stop()
+
 
 class SubClientPartnersLending(Client):
     """Handles the Lending Request endpoints of Resource Sharing Partners API"""
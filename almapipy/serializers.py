@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pluggable json backends used to encode requests and decode responses
+"""
+
+import json
+
+from . import utils
+
+
+class JSONBackend(object):
+    """
+    Standard library json.
+
+    Backends decode straight from the response bytes, and encode to the
+    str or bytes sent as request body.
+    """
+
+    name = 'json'
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj)
+
+
+class OrjsonBackend(JSONBackend):
+    """json backend using orjson, if installed."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj)
+
+
+class UjsonBackend(JSONBackend):
+    """json backend using ujson, if installed."""
+
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False)
+
+
+BACKENDS = {'orjson': OrjsonBackend, 'ujson': UjsonBackend, 'json': JSONBackend}
+
+# Order in which backends are tried by 'auto'.
+PREFERENCE = ['orjson', 'ujson', 'json']
+
+
+def available():
+    """Returns the names of the backends that can be loaded, fastest first."""
+    names = []
+    for name in PREFERENCE:
+        try:
+            BACKENDS[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(backend='auto'):
+    """Returns a json backend.
+
+    Args:
+        backend (str or object): 'auto' for the fastest installed backend,
+            one of 'orjson', 'ujson' or 'json', or an object with
+            loads(bytes) and dumps(obj) methods.
+
+    Returns:
+        JSONBackend.
+    """
+    if backend == 'auto':
+        for name in PREFERENCE:
+            try:
+                return BACKENDS[name]()
+            except ImportError:
+                continue
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            message = "json backend must be 'auto' or one of "
+            message += ", ".join(PREFERENCE)
+            raise utils.ArgError(message)
+        try:
+            return BACKENDS[backend]()
+        except ImportError:
+            message = "json backend '{}' is not installed.".format(backend)
+            raise utils.ArgError(message)
+    if not (hasattr(backend, 'loads') and hasattr(backend, 'dumps')):
+        raise utils.ArgError("json backend must have loads() and dumps() methods.")
+    return backend
+
+
+# Used by clients created without a connection.
+DEFAULT = JSONBackend()
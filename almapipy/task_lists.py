@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import copy
+import random
+import time
+
 from .client import Client
 from . import utils
 
@@ -22,9 +26,9 @@ class SubClientTaskList(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of api
-        self.resources = SubClientTaskListResources(self.cnxn_params)
-        self.lending = SubClientTaskListLending(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(resources=SubClientTaskListResources,
+                      lending=SubClientTaskListLending)
 
 
 class SubClientTaskListResources(Client):
@@ -81,6 +85,137 @@ class SubClientTaskListResources(Client):
                                          data_key='requested_resource')
         return response
 
+    def watch(self, desks, callback, interval=30, min_interval=10,
+              max_interval=120, jitter=2, max_workers=8):
+        """Watches the lists of many desks and reports only what changed.
+
+        The current lists are loaded before returning, and are not reported
+        as changes. See TaskListWatcher for the polling behaviour.
+
+        Args:
+            desks (list): (library_id, circ_desk) tuples to watch.
+            callback (callable): Called as callback(library_id, circ_desk, added, removed).
+            interval (float): Initial seconds between polls.
+            min_interval (float): Shortest time between polls.
+            max_interval (float): Longest time between polls.
+            jitter (float): Longest random delay before polling a desk, in seconds.
+            max_workers (int): Number of desks polled at the same time.
+
+        Returns:
+            TaskListWatcher, polling in the background. Call stop() to end it.
+        """
+        watcher = TaskListWatcher(self, desks, callback=callback, interval=interval,
+                                  min_interval=min_interval, max_interval=max_interval,
+                                  jitter=jitter, max_workers=max_workers)
+        watcher.poll(notify=False)
+        watcher.start()
+        return watcher
+
+
+class TaskListWatcher(object):
+    """
+    Polls the pick-from-shelf lists of many circulation desks and reports changes.
+
+    All desks are polled concurrently, each after a small random delay so
+    calls do not hit Alma at the same instant. The last list of every desk
+    is kept, and only added and removed requested resources are reported.
+    The polling interval halves after a poll that found changes, and grows
+    by half after an idle one, between min_interval and max_interval.
+    A desk whose poll failed keeps its last list, and the error is kept in
+    errors until the desk is polled successfully again.
+
+    Args:
+        resources (SubClientTaskListResources): Client used to poll desks.
+        desks (list): (library_id, circ_desk) tuples to watch.
+        callback (callable): Called as callback(library_id, circ_desk, added, removed)
+            for every desk whose list changed.
+        interval (float): Initial seconds between polls.
+        min_interval (float): Shortest time between polls.
+        max_interval (float): Longest time between polls.
+        jitter (float): Longest random delay before polling a desk, in seconds.
+        max_workers (int): Number of desks polled at the same time.
+
+    Attributes:
+        errors (dict): {(library_id, circ_desk): error} of the last failed poll
+            of each desk.
+    """
+
+    def __init__(self, resources, desks, callback=None, interval=30,
+                 min_interval=10, max_interval=120, jitter=2, max_workers=8):
+        self.resources = resources
+        self.desks = [tuple(desk) for desk in desks]
+        self.callback = callback
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.state = {}
+        self.errors = {}
+        self._poller = None
+
+    def __fetch__(self, desk):
+        library_id, circ_desk = desk
+        if self.jitter:
+            time.sleep(random.uniform(0, self.jitter))
+
+        def get_page(limit, offset):
+            return self.resources.get(library_id, circ_desk, limit=limit, offset=offset,
+                                      q_params={'format': 'json'})
+
+        resources = utils.fetch_pages(get_page, 'requested_resource', max_workers=1)
+        return {utils.content_hash(resource): resource for resource in resources}
+
+    def poll(self, notify=True):
+        """Polls every desk once.
+
+        Args:
+            notify (bool): Call the callback and adapt the interval.
+                Turned off to load the initial lists.
+
+        Returns:
+            Dictionary of {(library_id, circ_desk): (added, removed)}
+                for the desks whose list changed. Desks that failed are
+                left out, see self.errors.
+        """
+        changes = {}
+        for desk, current, error in utils.concurrent_map(self.__fetch__, self.desks,
+                                                         self.max_workers):
+            if error is not None:
+                self.errors[desk] = error
+                continue
+            self.errors.pop(desk, None)
+            previous = self.state.get(desk, {})
+            added = [current[key] for key in current if key not in previous]
+            removed = [previous[key] for key in previous if key not in current]
+            self.state[desk] = current
+            if added or removed:
+                changes[desk] = (added, removed)
+                if notify and self.callback is not None:
+                    self.callback(desk[0], desk[1], added, removed)
+
+        if notify:
+            if changes:
+                self.interval = max(self.interval / 2.0, self.min_interval)
+            else:
+                self.interval = min(self.interval * 1.5, self.max_interval)
+        return changes
+
+    def current(self, library_id, circ_desk):
+        """Returns the last known list of requested resources of a desk."""
+        return list(self.state.get((library_id, circ_desk), {}).values())
+
+    def start(self):
+        """Polls in the background on the adaptive interval."""
+        self.stop()
+        self._poller = utils.Periodic(self.poll, lambda: self.interval)
+        self._poller.start()
+
+    def stop(self):
+        """Stops background polling."""
+        if self._poller is not None:
+            self._poller.stop()
+
 
 class SubClientTaskListLending(Client):
     """Handles the requested resources endpoints of Task List API"""
@@ -90,6 +225,10 @@ class SubClientTaskListLending(Client):
         self.cnxn_params['api_uri'] += '/rs/lending-requests'
         self.cnxn_params['api_uri_full'] += '/rs/lending-requests'
 
+        # Short lived cache of aggregated lists, shared by get_all() callers.
+        self.cache = utils.TTLCache(ttl=15)
+        self._single_flight = utils.SingleFlight()
+
     def get(self, library_id, q_params={}, raw=False):
         """Retrieve list of lending requests in Alma.
 
@@ -112,3 +251,70 @@ class SubClientTaskListLending(Client):
         response = self.read(url, args, raw=raw)
 
         return response
+
+    def get_all(self, library_ids, order_by='request_id', max_workers=8, q_params={}):
+        """Retrieve lending requests of many libraries as a single list.
+
+        Libraries are queried concurrently and requests found in more than
+        one library are kept once. A result without failures is cached for a
+        few seconds (see self.cache.ttl), and callers asking for the same
+        libraries while a fetch is running wait for it instead of starting
+        their own. Every caller gets its own copy of the result.
+
+        Args:
+            library_ids (list): Libraries to query.
+                Use conf.units.get_libraries() to retrieve valid arguments.
+            order_by (str): Field the requests are sorted by.
+            max_workers (int): Number of libraries queried at the same time.
+            q_params (dict): Any additional query parameters.
+
+        Returns:
+            Dictionary with the sorted 'requests' list, 'timing' in seconds
+                and 'failed' errors by library_id, and the 'fetched' time.
+        """
+        library_ids = sorted(set(str(library_id) for library_id in library_ids))
+        params = tuple(sorted((str(k), str(v)) for k, v in q_params.items()))
+        cache_key = (tuple(library_ids), params)
+
+        def fetch_all():
+            result = self.__fetch_all__(library_ids, max_workers, q_params)
+            # A library error is not served to later callers.
+            if not result['failed']:
+                self.cache.set(cache_key, result)
+            return result
+
+        result = self.cache.get(cache_key)
+        if result is None:
+            result = self._single_flight.do(cache_key, fetch_all)
+
+        result = copy.deepcopy(result)
+        result['requests'] = sorted(result['requests'],
+                                    key=lambda request: str(request.get(order_by, '')))
+        return result
+
+    def __fetch_all__(self, library_ids, max_workers, q_params):
+        args = q_params.copy()
+        args['format'] = 'json'
+
+        def fetch(library_id):
+            started = time.monotonic()
+            response = self.get(library_id, q_params=args)
+            requests = response.get('user_resource_sharing_request') or []
+            return requests, time.monotonic() - started
+
+        requests = {}
+        timing = {}
+        failed = {}
+        for library_id, result, error in utils.concurrent_map(fetch, library_ids, max_workers):
+            if error is not None:
+                if not isinstance(error, utils.Error):
+                    raise error
+                failed[library_id] = error
+                continue
+            library_requests, timing[library_id] = result
+            for request in library_requests:
+                key = request.get('request_id') or utils.content_hash(request)
+                requests.setdefault(key, request)
+
+        return {'requests': list(requests.values()), 'timing': timing,
+                'failed': failed, 'fetched': time.time()}
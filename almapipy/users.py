@@ -24,11 +24,11 @@ class SubClientUsers(Client):
         self.cnxn_params['api_uri_full'] = self.cnxn_params['base_uri']
         self.cnxn_params['api_uri_full'] += self.cnxn_params['api_uri']
 
-        # Hook in subclients of api
-        self.loans = SubClientUsersLoans(self.cnxn_params)
-        self.requests = SubClientUsersRequests(self.cnxn_params)
-        self.fees = SubClientUsersFees(self.cnxn_params)
-        self.deposits = SubClientUsersDeposits(self.cnxn_params)
+        # Hook in subclients of api, created on first access
+        self.__lazy__(loans=SubClientUsersLoans,
+                      requests=SubClientUsersRequests,
+                      fees=SubClientUsersFees,
+                      deposits=SubClientUsersDeposits)
 
         # Returned values by functions on success/failure (not much "creativity"
         # for now)
@@ -4,6 +4,15 @@
 Error classes and other helpful functions
 """
 
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import types
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
 
 class Error(Exception):
     """Base class for exceptions"""
@@ -26,3 +35,451 @@ class ArgError(Error):
     def __init__(self, message):
         super(ArgError, self).__init__(message)
         self.message = "Invalid Argument: " + message
+
+
+class TTLCache(object):
+    """
+    Thread-safe dictionary whose entries expire ttl seconds after being set.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SingleFlight(object):
+    """
+    Collapses identical calls made at the same time into a single one.
+
+    The first caller of a key runs the call, and callers arriving while it
+    is in flight wait for its result instead of running their own.
+    Every caller gets the same result object, so calls should return
+    something callers do not modify, e.g. the raw response that each caller
+    then parses on its own. Errors are raised in every caller.
+    'hits' counts calls that were served by another one in flight,
+    'misses' those that ran.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Returns func(), or the result of the identical call in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = Future()
+                self._calls[key] = call
+                self.misses += 1
+                leader = True
+            else:
+                self.hits += 1
+                leader = False
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'in_flight': len(self._calls)}
+
+
+class ResponseCache(object):
+    """
+    Thread-safe cache of GET responses that follows the resource hierarchy.
+
+    Entries are grouped by url. A write to a url invalidates the entries of
+    that url, of its sub-resources, e.g. /loans and /fees below a user, and
+    of every parent url, e.g. the user search pages of /users.
+
+    A GET that was in flight while its url was invalidated would store the
+    body from before the write. Callers read generation(url) before the
+    call and pass it to set(), which drops the entry if the url was
+    invalidated in between.
+
+    Args:
+        ttl (float): Seconds an entry is kept.
+        max_entries (int): Expired entries are purged past this size,
+            then the oldest urls are dropped.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._size = 0
+        # {path: [invalidations of the path, invalidations of it or below it]}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def __path__(url):
+        return url.split('?', 1)[0].rstrip('/')
+
+    @staticmethod
+    def __parents__(path):
+        parents = []
+        while '/' in path:
+            path = path.rsplit('/', 1)[0]
+            parents.append(path)
+        return parents
+
+    def __generation__(self, path):
+        # Counts the invalidations that evicted the path: of the path or
+        # below it, and of any of its parents.
+        generation = self._generations.get(path, [0, 0])[1]
+        for parent in self.__parents__(path):
+            generation += self._generations.get(parent, [0, 0])[0]
+        return generation
+
+    def generation(self, url):
+        """Returns a token that changes whenever the url is invalidated."""
+        path = self.__path__(url)
+        with self._lock:
+            return self.__generation__(path)
+
+    def get(self, url, key, default=None):
+        path = self.__path__(url)
+        with self._lock:
+            entry = self._data.get(path, {}).get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return default
+            self.hits += 1
+        return copy.deepcopy(entry[1])
+
+    def set(self, url, key, value, generation=None):
+        """Stores a response. Returns False if it was dropped.
+
+        Args:
+            url (str): Url of the call.
+            key: Key of the call, e.g. the url with its parameters.
+            value: Response to store.
+            generation (int): generation(url) read before making the call.
+                The response is dropped if the url was invalidated since.
+        """
+        path = self.__path__(url)
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        with self._lock:
+            if generation is not None and generation != self.__generation__(path):
+                return False
+            entries = self._data.setdefault(path, {})
+            if key not in entries:
+                self._size += 1
+            entries[key] = entry
+            if self._size > self.max_entries:
+                self.__prune__()
+        return True
+
+    def __prune__(self):
+        now = time.monotonic()
+        for path in list(self._data):
+            entries = self._data[path]
+            for key in [key for key, entry in entries.items() if entry[0] < now]:
+                del entries[key]
+                self._size -= 1
+            if not entries:
+                del self._data[path]
+        while self._size > self.max_entries:
+            path = next(iter(self._data))
+            self._size -= len(self._data.pop(path))
+
+    def invalidate(self, url):
+        """Evicts a url, its sub-resources and its parents. Returns the count."""
+        path = self.__path__(url)
+        parents = set(self.__parents__(path))
+
+        evicted = 0
+        with self._lock:
+            self._generations.setdefault(path, [0, 0])[0] += 1
+            for changed in parents | set([path]):
+                self._generations.setdefault(changed, [0, 0])[1] += 1
+            for cached in list(self._data):
+                if cached == path or cached.startswith(path + '/') or cached in parents:
+                    entries = self._data.pop(cached)
+                    evicted += len(entries)
+            self._size -= evicted
+        return evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._size
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': self._size}
+
+
+_MISSING = object()
+
+
+def frozen(mapping):
+    """Returns a read-only copy of a mapping.
+
+    Used for connection parameters shared between threads. Calling copy()
+    on the result gives a regular dictionary to build new parameters from.
+    """
+    return types.MappingProxyType(dict(mapping))
+
+
+def concurrent_map(func, items, max_workers=8):
+    """Calls func on each item in a thread pool.
+
+    Items are consumed lazily, so generators of any length can be passed
+    without queueing all of them up front.
+
+    Args:
+        func (callable): Called with a single item.
+        items (iterable): Arguments for func.
+        max_workers (int): Number of calls made at the same time.
+
+    Yields:
+        (item, result, error) tuples in order of completion.
+            error is the raised exception, or None if the call succeeded.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        while True:
+            for item in items:
+                pending[executor.submit(func, item)] = item
+                if len(pending) >= max_workers * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+
+def iter_records(get_page, data_key, limit=100, offset=0):
+    """Yields the records of a paginated json response, one page at a time.
+
+    Args:
+        get_page (callable): Called as get_page(limit, offset),
+            returns a json response.
+        data_key (str): Dictionary key for accessing data.
+        limit (int): Number of records per call. Valid values are 1-100.
+        offset (int): The row number to start with.
+
+    Yields:
+        Records, as soon as their page is retrieved.
+    """
+    while True:
+        response = get_page(limit, offset)
+        records = response.get(data_key) or []
+        for record in records:
+            yield record
+        offset += len(records)
+        if not records or offset >= int(response.get('total_record_count', 0)):
+            break
+
+
+class RateLimiter(object):
+    """
+    Spaces out calls shared by many threads to at most rate per second.
+    """
+
+    def __init__(self, rate=25):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def is_retryable(error):
+    """True for errors worth retrying: throttling, server errors and network failures."""
+    if isinstance(error, AlmaError):
+        return str(error.response) == '429' or str(error.response)[:1] == '5'
+    return isinstance(error, IOError)
+
+
+def chunked(items, size):
+    """Yields lists of up to size items from any iterable."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def fetch_pages(get_page, data_key, limit=100, max_workers=8):
+    """Retrieves all records of a paginated json response.
+
+    The first page gives the total record count, then the remaining pages
+    are fetched concurrently.
+
+    Args:
+        get_page (callable): Called as get_page(limit, offset),
+            returns a json response.
+        data_key (str): Dictionary key for accessing data.
+        limit (int): Number of records per call. Valid values are 1-100.
+        max_workers (int): Number of calls made at the same time.
+
+    Returns:
+        List of records, in the order of the listing.
+    """
+    first = get_page(limit, 0)
+    total = int(first.get('total_record_count', 0))
+    pages = {0: first.get(data_key) or []}
+    offsets = range(limit, total, limit)
+    for offset, response, error in concurrent_map(lambda offset: get_page(limit, offset),
+                                                  offsets, max_workers):
+        if error is not None:
+            raise error
+        pages[offset] = response.get(data_key) or []
+
+    records = []
+    for offset in sorted(pages):
+        records += pages[offset]
+    return records
+
+
+class Periodic(object):
+    """
+    Calls func from a background thread, every interval seconds.
+
+    interval may also be a callable returning the delay before the next call.
+    Errors raised by func are kept in last_error and do not stop the loop.
+    """
+
+    def __init__(self, func, interval):
+        self.func = func
+        self.interval = interval
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __delay__(self):
+        if callable(self.interval):
+            return self.interval()
+        return self.interval
+
+    def __loop__(self, stop):
+        while not stop.wait(self.__delay__()):
+            try:
+                self.func()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+    def start(self):
+        self.stop()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.__loop__, args=(self._stop,),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+def content_hash(content):
+    """Hashes json-like content independently of key order."""
+    body = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+class FileCache(object):
+    """
+    json documents kept on disk between runs, one file per key.
+
+    Args:
+        directory (str): Folder of the cache. Created if missing.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __path__(self, key):
+        name = hashlib.sha256(str(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def get(self, key, default=None):
+        try:
+            with open(self.__path__(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return default
+
+    def set(self, key, value):
+        path = self.__path__(key)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compares the json backends of almapipy.serializers on large Alma pages.
+
+Pages are synthetic but shaped like the users and PO-line responses,
+100 records each. Run from the repository root:
+
+    python benchmarks/json_backends.py [--pages 20] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almapipy import serializers  # noqa: E402
+
+
+def user(i):
+    return {
+        'primary_id': 'user{:06d}'.format(i),
+        'first_name': 'Fiona',
+        'last_name': 'Ortega Núñez',
+        'full_name': 'Fiona Ortega Núñez',
+        'user_group': {'value': 'UNDERGRAD', 'desc': 'Undergraduate'},
+        'account_type': {'value': 'EXTERNAL', 'desc': 'External'},
+        'status': {'value': 'ACTIVE', 'desc': 'Active'},
+        'expiry_date': '2027-06-30Z',
+        'purge_date': '2028-06-30Z',
+        'contact_info': {
+            'address': [{'line1': '{} Main St.'.format(i), 'city': 'Davis',
+                         'postal_code': '95616', 'country': {'value': 'USA'},
+                         'address_type': [{'value': 'home', 'desc': 'Home'}],
+                         'preferred': True}],
+            'email': [{'email_address': 'user{}@example.edu'.format(i),
+                       'email_type': [{'value': 'personal'}], 'preferred': True}],
+            'phone': [{'phone_number': '530-555-{:04d}'.format(i % 10000),
+                       'phone_type': [{'value': 'mobile'}], 'preferred': True}],
+        },
+        'user_identifier': [{'id_type': {'value': 'BARCODE'},
+                             'value': '2{:013d}'.format(i), 'status': 'ACTIVE'}],
+        'user_role': [{'status': {'value': 'ACTIVE'},
+                       'scope': {'value': 'MAIN', 'desc': 'Main Library'},
+                       'role_type': {'value': '200', 'desc': 'Patron'}}],
+        'user_statistic': [{'statistic_category': {'value': 'SC{}'.format(i % 7)},
+                            'category_type': {'value': 'CT'}}],
+        'loans': {'value': i % 13, 'link': '/users/user{:06d}/loans'.format(i)},
+        'fees': {'value': (i % 5) * 2.5, 'currency': 'USD'},
+        'link': 'https://api-na.hosted.exlibrisgroup.com/almaws/v1/users/user{:06d}'.format(i),
+    }
+
+
+def po_line(i):
+    return {
+        'number': 'POL-{}'.format(i),
+        'owner': {'value': 'MAIN', 'desc': 'Main Library'},
+        'type': {'value': 'PRINTED_BOOK_OT', 'desc': 'Print Book - One Time'},
+        'vendor': {'value': 'VEND{}'.format(i % 40)},
+        'vendor_account': 'ACC{}'.format(i % 40),
+        'price': {'sum': str(10 + i % 90), 'currency': {'value': 'USD'}},
+        'fund_distribution': [{'fund_code': {'value': 'FUND{}'.format(i % 25)},
+                               'percent': 100,
+                               'amount': {'sum': str(10 + i % 90)}}],
+        'resource_metadata': {
+            'mms_id': {'value': '99{:014d}'.format(i)},
+            'title': 'A fairly long title about libraries, volume {}'.format(i),
+            'author': 'Écrivain, Anne',
+            'isbn': '978{:010d}'.format(i),
+            'publisher': 'University Press',
+            'publication_date': '2024',
+        },
+        'location': [{'quantity': 1, 'library': {'value': 'MAIN'},
+                      'shelving_location': 'STACKS',
+                      'copy': [{'barcode': '3{:013d}'.format(i),
+                                'receive_date': None,
+                                'expected_receipt_date': '2026-11-01Z'}]}],
+        'status': {'value': 'SENT', 'desc': 'Sent'},
+        'note': [{'note_text': 'Rush order #{}'.format(i)}],
+        'link': 'https://api-na.hosted.exlibrisgroup.com/almaws/v1/acq/po-lines/POL-{}'.format(i),
+    }
+
+
+def pages(make, data_key, count):
+    return [{data_key: [make(page * 100 + i) for i in range(100)],
+             'total_record_count': count * 100}
+            for page in range(count)]
+
+
+def run(backends, name, docs, repeat):
+    payloads = [serializers.JSONBackend().dumps(doc).encode('utf-8') for doc in docs]
+    size = sum(len(payload) for payload in payloads) / 1e6
+    print("\n{}: {} pages, {:.1f} MB".format(name, len(docs), size))
+    print("{:<8} {:>12} {:>12}".format('backend', 'decode MB/s', 'encode MB/s'))
+    for backend in backends:
+        decode = min(timeit.repeat(lambda: [backend.loads(p) for p in payloads],
+                                   number=1, repeat=repeat))
+        encode = min(timeit.repeat(lambda: [backend.dumps(d) for d in docs],
+                                   number=1, repeat=repeat))
+        print("{:<8} {:>12.1f} {:>12.1f}".format(backend.name, size / decode, size / encode))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    options = parser.parse_args()
+
+    backends = [serializers.get_backend(name) for name in serializers.available()]
+    run(backends, 'users', pages(user, 'user', options.pages), options.repeat)
+    run(backends, 'po_lines', pages(po_line, 'po_line', options.pages), options.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measures almapipy import time and AlmaCnxn construction time.
+
+Imports are timed in fresh interpreters, so nothing is already cached in
+sys.modules. Run from the repository root:
+
+    python benchmarks/startup.py [--repeat 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import almapipy
+imported = time.perf_counter()
+alma = almapipy.AlmaCnxn('key')
+constructed = time.perf_counter()
+almapipy.AlmaCnxn('key')
+reconstructed = time.perf_counter()
+alma.users.loans
+used = time.perf_counter()
+print(imported - started, constructed - imported, reconstructed - constructed,
+      used - reconstructed,
+      len([m for m in sys.modules if m.startswith('almapipy.')]))
+"""
+
+
+def measure(repeat):
+    script = SCRIPT.format(root=ROOT)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', script])
+        runs.append([float(value) for value in output.split()])
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    options = parser.parse_args()
+
+    runs = measure(options.repeat)
+    # The first connection also loads the json backend.
+    labels = ['import almapipy', 'first AlmaCnxn()', 'next AlmaCnxn()',
+              'first alma.users.loans']
+    print("{:<24} {:>10} {:>10}".format('', 'min ms', 'median ms'))
+    for i, label in enumerate(labels):
+        values = [run[i] * 1000 for run in runs]
+        print("{:<24} {:>10.2f} {:>10.2f}".format(label, min(values),
+                                                  statistics.median(values)))
+    print("almapipy modules loaded: {}".format(int(runs[-1][4])))
+
+
+if __name__ == '__main__':
+    main()
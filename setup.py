@@ -24,6 +24,7 @@ setup(
     long_description = long_description,
 #    long_description_content_type = "text/markdown",
     install_requires = ['requests'],
+    extras_require = {'fast': ['orjson']},
     keywords = 'alma exlibris exlibrisgroup api bibliographic',
     packages=find_packages(),
     classifiers = [
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fixtures serving canned Alma responses in place of the requests library
+"""
+
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import pytest
+
+import almapipy
+from almapipy import client
+
+
+class FakeResponse(object):
+    """Minimal stand-in for requests.Response. str bodies are served as xml."""
+
+    def __init__(self, url, status_code=200, body=None):
+        self.url = url
+        self.status_code = status_code
+        if isinstance(body, str):
+            self.headers = {'content-type': 'application/xml;charset=UTF-8'}
+            self.content = body.encode('utf-8')
+        else:
+            self.headers = {'content-type': 'application/json;charset=UTF-8'}
+            self.content = json.dumps(body if body is not None else {}).encode('utf-8')
+        self.text = self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeAlma(object):
+    """
+    Serves json by url path, and records every call made.
+
+    Routes are either a fixed body or a callable(params) returning a body,
+    or (status_code, body). Unknown paths answer 404. Bodies sent by Post
+    and Put are kept in 'sent' as (method, path, data, headers).
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.calls = []
+        self.sent = []
+        self.delay = 0
+        self._lock = threading.Lock()
+
+    def route(self, path, body):
+        self.routes[path] = body
+
+    def pages(self, path, data_key, records):
+        """Serves records page by page, honoring limit and offset."""
+        def handler(params):
+            limit = int(params.get('limit', 10))
+            offset = int(params.get('offset', 0))
+            return {data_key: records[offset:offset + limit],
+                    'total_record_count': len(records)}
+        self.routes[path] = handler
+
+    def fail(self, path, status_code=500, message='Server error'):
+        error = {'errorList': {'error': [{'errorCode': str(status_code),
+                                          'errorMessage': message}]}}
+        self.routes[path] = lambda params: (status_code, error)
+
+    def count(self, path, method='GET'):
+        return len([call for call in self.calls if call == (method, path)])
+
+    def __respond__(self, method, url, params):
+        path = urlsplit(url).path
+        with self._lock:
+            self.calls.append((method, path))
+        if self.delay:
+            time.sleep(self.delay)
+        route = self.routes.get(path)
+        if route is None:
+            return FakeResponse(url, 404, {'errorList': {'error': [
+                {'errorCode': '404', 'errorMessage': 'No route ' + path}]}})
+        body = route(dict(params or {})) if callable(route) else route
+        if isinstance(body, tuple):
+            return FakeResponse(url, body[0], body[1])
+        return FakeResponse(url, 200, body)
+
+    def get(self, url, params=None, headers=None):
+        return self.__respond__('GET', url, params)
+
+    def post(self, url, data=None, params=None, headers=None):
+        self.sent.append(('POST', urlsplit(url).path, data, headers))
+        return self.__respond__('POST', url, params)
+
+    def put(self, url, data=None, headers=None):
+        self.sent.append(('PUT', urlsplit(url).path, data, headers))
+        return self.__respond__('PUT', url, None)
+
+    def delete(self, url, params=None, headers=None):
+        return self.__respond__('DELETE', url, params)
+
+
+class ListSink(object):
+    """Export sink keeping rows in memory."""
+
+    def __init__(self):
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def write(self, row):
+        with self._lock:
+            self.rows.append(row)
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def sink():
+    return ListSink()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeAlma()
+    monkeypatch.setattr(client, 'requests', fake)
+    return fake
+
+
+@pytest.fixture
+def alma(fake):
+    return almapipy.AlmaCnxn('key')
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import almapipy
+from almapipy import export
+
+BASE = '/almaws/v1/acq'
+
+
+def test_export_ledger_counts_written_rows(alma, fake, sink):
+    fake.pages(BASE + '/vendors', 'vendor', [{'code': 'V1'}, {'code': 'V2'}])
+    invoices = {'V1': [{'id': 'I1'}, {'id': 'I2'}], 'V2': [{'id': 'I3'}]}
+    po_lines = {'V1': [{'number': 'P1'}], 'V2': [{'number': 'P2'}]}
+    for code in invoices:
+        fake.pages(BASE + '/vendors/' + code + '/invoices', 'invoice', invoices[code])
+        fake.pages(BASE + '/vendors/' + code + '/po-lines', 'po_line', po_lines[code])
+    # The global listings repeat every record, plus one without a vendor.
+    fake.pages(BASE + '/invoices', 'invoice',
+               invoices['V1'] + invoices['V2'] + [{'id': 'I4'}])
+    fake.pages(BASE + '/po-lines', 'po_line', po_lines['V1'] + po_lines['V2'])
+
+    stats = alma.acq.export_ledger(sink, max_workers=4)
+
+    assert sorted(row.get('id') or row.get('number') for row in sink.rows) == \
+        ['I1', 'I2', 'I3', 'I4', 'P1', 'P2']
+    assert stats['rows'] == len(sink.rows) == 6
+    assert stats['duplicates'] == 5
+    assert not stats['failed']
+
+
+def test_fund_monitor_reports_changes_after_first_load(alma, fake):
+    funds = [{'code': 'F1', 'available_balance': {'sum': '100.0'}},
+             {'code': 'F2', 'available_balance': {'sum': '50.0'}}]
+    fake.pages(BASE + '/funds', 'fund', funds)
+    events = []
+
+    monitor = alma.acq.funds.monitor(callback=events.append)
+    assert events == []
+    assert monitor.balance('F1') == 100.0
+
+    funds[0] = {'code': 'F1', 'available_balance': {'sum': '75.0'}}
+    assert monitor.refresh() == [{'code': 'F1', 'old': 100.0, 'new': 75.0}]
+    assert events == [{'code': 'F1', 'old': 100.0, 'new': 75.0}]
+
+
+def test_receiving_queue_indexes_items_and_caches_them(alma, fake):
+    fake.pages(BASE + '/po-lines', 'po_line', [{'number': 'P1'}, {'number': 'P2'}])
+    fake.route(BASE + '/po-lines/P1/items', {'item': [
+        {'item_data': {'barcode': 'B1', 'expected_arrival_date': '2024-03-01Z'}}]})
+    fake.route(BASE + '/po-lines/P2/items', {'item': [
+        {'item_data': {'barcode': 'B2', 'expected_arrival_date': '2024-01-01Z'}},
+        {'item_data': {'barcode': 'B3'}}]})
+
+    queue = alma.acq.po_lines.receiving_queue()
+    assert len(queue) == 2
+    assert sorted(queue.by_barcode) == ['B1', 'B2', 'B3']
+    assert list(queue.by_expected_date) == ['2024-01-01', '2024-03-01', None]
+
+    queue.by_barcode['B1']['note'] = 'Damaged'
+    reopened = alma.acq.po_lines.receiving_queue()
+    assert fake.count(BASE + '/po-lines/P1/items') == 1
+    assert 'note' not in reopened.by_barcode['B1']
+
+    reopened.by_barcode['B2']['note'] = 'Damaged'
+    assert 'note' not in alma.acq.po_lines.receiving_queue().by_barcode['B2']
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_get_all_with_amendments_reuses_cached_bodies(fake, tmp_path, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    licenses = BASE + '/licenses'
+    fake.pages(licenses, 'license', [{'code': 'L1'}, {'code': 'L2'}])
+    fake.route(licenses + '/L1/amendments', {'amendment': [{'code': 'A1'}, {'code': 'A2'}]})
+    fake.route(licenses + '/L2/amendments', {'amendment': []})
+    fake.route(licenses + '/L1/amendments/A1', {'code': 'A1', 'name': 'First'})
+    fake.route(licenses + '/L1/amendments/A2', {'code': 'A2', 'name': 'Second'})
+
+    result = alma.acq.licenses.get_all_with_amendments(cache_dir=str(tmp_path))
+    assert [license['code'] for license in result] == ['L1', 'L2']
+    assert [a['name'] for a in result[0]['amendments']] == ['First', 'Second']
+    assert result[1]['amendments'] == []
+
+    again = alma.acq.licenses.get_all_with_amendments(cache_dir=str(tmp_path))
+    assert again == result
+    assert fake.count(licenses + '/L1/amendments/A1') == 1
+
+
+def test_resumed_export_ledger_does_not_repeat_rows(alma, fake, sink, tmp_path):
+    fake.pages(BASE + '/vendors', 'vendor', [{'code': 'V1'}, {'code': 'V2'}])
+    fake.pages(BASE + '/vendors/V1/invoices', 'invoice', [{'id': 'I1'}])
+    fake.pages(BASE + '/vendors/V1/po-lines', 'po_line', [{'number': 'P1'}])
+    fake.fail(BASE + '/vendors/V2/invoices', 400, 'Unknown vendor')
+    fake.pages(BASE + '/vendors/V2/po-lines', 'po_line', [{'number': 'P2'}])
+    # Global listings without vendor fields.
+    fake.pages(BASE + '/invoices', 'invoice', [{'id': 'I1'}, {'id': 'I2'}])
+    fake.pages(BASE + '/po-lines', 'po_line', [{'number': 'P1'}, {'number': 'P2'}])
+    path = str(tmp_path / 'ledger.progress')
+
+    stats = alma.acq.export_ledger(sink, include_all=False,
+                                   checkpoint=export.Checkpoint(path))
+    assert list(stats['failed']) == ['V2']
+
+    fake.pages(BASE + '/vendors/V2/invoices', 'invoice', [{'id': 'I2'}])
+    resumed_from = len(sink.rows)
+    stats = alma.acq.export_ledger(sink, checkpoint=export.Checkpoint(path))
+    assert not stats['failed']
+
+    written = [row.get('id') or row.get('number') for row in sink.rows]
+    assert sorted(written) == ['I1', 'I2', 'P1', 'P2']
+    assert stats['rows'] == len(sink.rows) - resumed_from
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import almapipy
+
+REPORT = (
+    '<report><QueryResult><ResumptionToken>T1</ResumptionToken>'
+    '<IsFinished>{finished}</IsFinished><ResultXml>'
+    '<rowset xmlns="urn:schemas-microsoft-com:xml-analysis:rowset">'
+    '<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:saw-sql="urn:saw-sql">'
+    '<xsd:element name="Column1" saw-sql:columnHeading="Title"/></xsd:schema>'
+    '<Row><Column1>{title}</Column1></Row>'
+    '</rowset></ResultXml></QueryResult></report>')
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_report_all_records(fake, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+
+    def handler(params):
+        if 'token' in params:
+            return REPORT.format(finished='true', title='Second')
+        return REPORT.format(finished='false', title='First')
+    fake.route('/almaws/v1/analytics/reports', handler)
+
+    rows = alma.analytics.reports.get('/shared/Report', all_records=True, return_json=True)
+    assert rows == [{'title': 'First'}, {'title': 'Second'}]
+
+
+def test_analytics_namespaces_stay_local(alma):
+    report_ns = alma.analytics.reports.cnxn_params['xml_ns']
+    assert 'report' in report_ns
+    assert 'report' not in alma.cnxn_params['xml_ns']
+    assert 'report' not in alma.bibs.catalog.cnxn_params['xml_ns']
+    assert alma.bibs.catalog.cnxn_params['xml_ns']['header'] == report_ns['header']
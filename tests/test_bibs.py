@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import almapipy
+from almapipy import utils
+
+
+def test_get_options_batch(alma, fake):
+    fake.route('/almaws/v1/bibs/1/request-options', {'request_option': ['HOLD']})
+    fake.route('/almaws/v1/bibs/2/holdings/H/items/I/request-options',
+               {'request_option': ['BOOKING']})
+    fake.fail('/almaws/v1/bibs/3/request-options', 400)
+
+    matrix = alma.bibs.requests.get_options_batch(['1', ['2', 'H', 'I'], '3', '1'],
+                                                  user_ids=['GUEST', 'U1'])
+    assert matrix['1']['U1'] == {'request_option': ['HOLD']}
+    assert matrix[('2', 'H', 'I')]['GUEST'] == {'request_option': ['BOOKING']}
+    assert isinstance(matrix['3']['GUEST'], utils.AlmaError)
+    assert fake.count('/almaws/v1/bibs/1/request-options') == 2
+
+
+def test_batch_results_are_cached_by_copy(alma, fake):
+    fake.route('/almaws/v1/bibs/1/booking-availability', {'booking_availability': []})
+    first = alma.bibs.requests.get_availability_batch(['1'], 7)
+    first['1']['booking_availability'].append('changed')
+
+    second = alma.bibs.requests.get_availability_batch(['1'], 7)
+    assert second['1'] == {'booking_availability': []}
+    assert fake.count('/almaws/v1/bibs/1/booking-availability') == 1
+
+
+def test_export_circulation_pages_loans(alma, fake, sink):
+    fake.pages('/almaws/v1/bibs/collections/C1/bibs', 'bib',
+               [{'mms_id': str(i), 'title': 'T{}'.format(i)} for i in range(3)])
+    for i in range(3):
+        fake.pages('/almaws/v1/bibs/{}/loans'.format(i), 'item_loan',
+                   [{'loan_id': str(n)} for n in range(150 * i)])
+        fake.pages('/almaws/v1/bibs/{}/requests'.format(i), 'user_request', [])
+
+    stats = alma.bibs.export_circulation('C1', sink)
+    assert stats['done'] == 3 and not stats['failed']
+    loans = {row['mms_id']: len(row['loans']) for row in sink.rows}
+    assert loans == {'0': 0, '1': 150, '2': 300}
+
+
+def test_export_representations_pages_representations(alma, fake, sink):
+    fake.pages('/almaws/v1/bibs/1/representations', 'representation',
+               [{'id': str(i)} for i in range(120)])
+    for i in range(120):
+        fake.route('/almaws/v1/bibs/1/representations/{}/files'.format(i),
+                   {'representation_file': [{'pid': 'F{}'.format(i), 'path': 'p'}]})
+    fake.fail('/almaws/v1/bibs/2/representations', 500)
+
+    stats = alma.bibs.export_representations(sink, bib_ids=['1', '2'])
+    assert len(sink.rows) == 120
+    assert stats['done'] == 1 and list(stats['failed']) == ['2']
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_linked_data_export(fake, sink, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    for i in range(5):
+        fake.route('/almaws/v1/bibs/linked-open-data/{}'.format(i), {'@id': str(i)})
+
+    stats = alma.bibs.linked_data.export(range(5), sink, rate=None)
+    assert stats['done'] == 5 and not stats['failed']
+    assert sorted(row['@id'] for row in sink.rows) == ['0', '1', '2', '3', '4']
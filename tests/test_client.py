@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+import pytest
+
+import almapipy
+from almapipy import serializers, utils
+
+
+def test_read_passes_apikey_and_parses_json(alma, fake):
+    fake.route('/almaws/v1/bibs/99', {'mms_id': '99'})
+    assert alma.bibs.catalog.get('99') == {'mms_id': '99'}
+    assert fake.count('/almaws/v1/bibs/99') == 1
+
+
+def test_legacy_get_helper(alma, fake):
+    fake.route('/almaws/v1/conf/general', {'institution': {'value': 'X'}})
+    assert alma.conf.general.read()['institution']['value'] == 'X'
+
+
+def test_read_all_pages_through_records(alma, fake):
+    partners = [{'partner_details': {'code': 'P{}'.format(i)}} for i in range(250)]
+    fake.pages('/almaws/v1/partners', 'partner', partners)
+    response = alma.partners.get(all_records=True, limit=100)
+    assert response['partner'] == partners
+
+
+def test_get_all_pages_through_records(alma, fake):
+    jobs = [{'id': str(i)} for i in range(130)]
+    fake.pages('/almaws/v1/conf/jobs', 'job', jobs)
+    assert alma.conf.jobs.read(all_records=True, limit=100)['job'] == jobs
+
+
+def test_get_without_headers(alma, fake):
+    requests = [{'request_id': str(i)} for i in range(15)]
+    fake.pages('/almaws/v1/users/U1/requests', 'user_request', requests)
+    response = alma.users.requests.read('U1', all_records=True)
+    assert response['user_request'] == requests
+
+
+def test_errors_raise_alma_error(alma, fake):
+    fake.fail('/almaws/v1/bibs/99', 400, 'Invalid mms_id')
+    with pytest.raises(utils.AlmaError):
+        alma.bibs.catalog.get('99')
+
+
+def test_single_flight_callers_parse_their_own_body(alma, fake):
+    fake.route('/almaws/v1/bibs/99', {'mms_id': '99', 'holdings': []})
+    fake.delay = 0.05
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(alma.bibs.catalog.get('99')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.count('/almaws/v1/bibs/99') == 1
+    assert alma.single_flight.stats()['hits'] == 3
+    results[0]['holdings'].append('changed')
+    assert results[1:] == [{'mms_id': '99', 'holdings': []}] * 3
+
+
+def test_concurrent_all_records_calls_get_their_own_pages(alma, fake):
+    loans = [{'loan_id': str(i)} for i in range(300)]
+    fake.pages('/almaws/v1/users/U1/loans', 'item_loan', loans)
+
+    def read():
+        response = alma.users.loans.read('U1', all_records=True, limit=100)
+        results.append(response['item_loan'])
+
+    # The calls overlap differently each round.
+    for _ in range(10):
+        results = []
+        threads = [threading.Thread(target=read) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(results) == 16
+        for result in results:
+            assert result == loans
+
+
+def test_response_cache_drops_writes_older_than_an_invalidation():
+    cache = utils.ResponseCache()
+    user = 'https://host/almaws/v1/users/U1'
+    generation = cache.generation(user)
+    sibling = cache.generation('https://host/almaws/v1/users/U2/loans')
+
+    cache.invalidate(user + '/loans')
+    assert cache.set(user, 'key', {'old': True}, generation) is False
+    assert cache.get(user, 'key') is None
+    # Writes elsewhere leave the generation alone.
+    assert cache.set('https://host/almaws/v1/users/U2/loans', 'key', {}, sibling)
+    assert cache.set(user, 'key', {'new': True}, cache.generation(user))
+    assert cache.get(user, 'key') == {'new': True}
+
+
+def test_get_in_flight_during_a_write_is_not_cached(fake):
+    alma = almapipy.AlmaCnxn('key', cache_ttl=60)
+    url = 'https://api-na.hosted.exlibrisgroup.com/almaws/v1/bibs/99'
+    bodies = [{'title': 'Old'}, {'title': 'New'}]
+
+    def handler(params):
+        body = bodies.pop(0)
+        if body['title'] == 'Old':
+            # A write lands while the old body is on its way back.
+            alma.cache.invalidate(url)
+        return body
+    fake.route('/almaws/v1/bibs/99', handler)
+
+    assert alma.bibs.catalog.get('99') == {'title': 'Old'}
+    assert alma.bibs.catalog.get('99') == {'title': 'New'}
+    assert alma.bibs.catalog.get('99') == {'title': 'New'}
+    assert fake.count('/almaws/v1/bibs/99') == 2
+
+
+def test_lazy_xml_fields_are_pulled_without_parsing_the_body(fake):
+    alma = almapipy.AlmaCnxn('key', lazy=True)
+    fake.route('/almaws/v1/bibs/99', '<bib total_record_count="1"><mms_id>99</mms_id>'
+                                     '<record><leader>x</leader></record></bib>')
+    bib = alma.bibs.catalog.get('99')
+    assert bib['total_record_count'] == '1'
+    assert bib['mms_id'] == '99'
+    assert bib.get('title') is None
+    assert 'record' in bib
+    assert bib._content is None
+    assert list(bib) == ['total_record_count', 'mms_id', 'record']
+    assert bib.content.find('record/leader').text == 'x'
+
+
+def test_lazy_json_keys_and_positional_access(fake):
+    alma = almapipy.AlmaCnxn('key', lazy=True)
+    fake.route('/almaws/v1/bibs/99', {'mms_id': '99', 'title': 'T'})
+    bib = alma.bibs.catalog.get('99')
+    assert sorted(bib) == ['mms_id', 'title']
+    assert sorted(bib.keys()) == ['mms_id', 'title']
+    with pytest.raises(TypeError):
+        bib[0]
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_errors_are_raised_before_parsing_the_body(fake, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    fake.fail('/almaws/v1/bibs/1', 400, 'Invalid mms_id')
+    fake.route('/almaws/v1/bibs/2', (500, (
+        '<web_service_result xmlns="http://com/exlibris/urm/general/xmlbeans">'
+        '<errorList><error><errorCode>500</errorCode>'
+        '<errorMessage>Internal error</errorMessage></error></errorList>'
+        '</web_service_result>')))
+
+    with pytest.raises(utils.AlmaError) as error:
+        alma.bibs.catalog.get('1')
+    assert 'Invalid mms_id' in error.value.message
+    assert error.value.response == 400
+
+    with pytest.raises(utils.AlmaError) as error:
+        alma.bibs.catalog.get('2')
+    assert error.value.message.startswith('500 - Internal error')
+
+
+class BytesBackend(object):
+    """Custom backend encoding to bytes, as orjson does."""
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, sort_keys=True).encode('utf-8')
+
+
+class MissingBackend(serializers.JSONBackend):
+    def __init__(self):
+        raise ImportError('not installed')
+
+
+def test_auto_backend_falls_back_in_order(monkeypatch):
+    monkeypatch.setitem(serializers.BACKENDS, 'orjson', MissingBackend)
+    monkeypatch.setitem(serializers.BACKENDS, 'ujson', serializers.UjsonBackend)
+    try:
+        import ujson
+        expected = 'ujson'
+    except ImportError:
+        expected = 'json'
+    assert serializers.get_backend('auto').name == expected
+
+    monkeypatch.setitem(serializers.BACKENDS, 'ujson', MissingBackend)
+    assert serializers.get_backend('auto').name == 'json'
+    assert serializers.available() == ['json']
+
+
+def test_backend_errors(monkeypatch):
+    with pytest.raises(utils.ArgError):
+        serializers.get_backend('simplejson')
+    monkeypatch.setitem(serializers.BACKENDS, 'orjson', MissingBackend)
+    with pytest.raises(utils.ArgError):
+        serializers.get_backend('orjson')
+    with pytest.raises(utils.ArgError):
+        serializers.get_backend(object())
+
+
+def test_custom_backend_is_used_as_is():
+    backend = BytesBackend()
+    assert serializers.get_backend(backend) is backend
+    assert almapipy.AlmaCnxn('key', json_backend=backend).cnxn_params['json_backend'] is backend
+
+
+def test_post_and_put_send_the_backend_output(fake):
+    alma = almapipy.AlmaCnxn('key', json_backend=BytesBackend())
+    url = 'https://api-na.hosted.exlibrisgroup.com/almaws/v1/users/U1'
+    fake.route('/almaws/v1/users/U1', {'primary_id': 'U1'})
+
+    assert alma.users.Post(url, data={'b': 1, 'a': 2}, args={}, headers={}) == {'primary_id': 'U1'}
+    assert alma.users.Put(url, data={'b': 1, 'a': 2}, headers={}) == {'primary_id': 'U1'}
+    for method, (sent_method, path, data, headers) in zip(['POST', 'PUT'], fake.sent):
+        assert sent_method == method
+        assert data == b'{"a": 2, "b": 1}'
+        assert headers['content-type'] == 'application/json'
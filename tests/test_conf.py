@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+
+import pytest
+
+import almapipy
+from almapipy import utils
+
+
+BASE = 'https://api-na.hosted.exlibrisgroup.com'
+
+
+def test_materialize_bib_set(alma, fake):
+    fake.route('/almaws/v1/conf/sets/S1', {'content': {'value': 'BIB_MMS'}})
+    fake.pages('/almaws/v1/conf/sets/S1/members', 'member',
+               [{'id': str(i)} for i in range(150)])
+    fake.route('/almaws/v1/bibs', lambda params: {
+        'bib': [{'mms_id': mms_id} for mms_id in params['mms_id'].split(',')]})
+
+    records = list(alma.conf.sets.materialize('S1'))
+    assert sorted(int(record['mms_id']) for record in records) == list(range(150))
+    assert fake.count('/almaws/v1/bibs') == 2
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_materialize_follows_member_links(fake, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    fake.route('/almaws/v1/conf/sets/S2', {'content': {'value': 'USER'}})
+    fake.pages('/almaws/v1/conf/sets/S2/members', 'member',
+               [{'id': 'U{}'.format(i), 'link': BASE + '/almaws/v1/users/U{}'.format(i)}
+                for i in range(3)])
+    for i in range(3):
+        fake.route('/almaws/v1/users/U{}'.format(i), {'primary_id': 'U{}'.format(i)})
+
+    records = list(alma.conf.sets.materialize('S2'))
+    assert sorted(record['primary_id'] for record in records) == ['U0', 'U1', 'U2']
+    assert all(isinstance(record, dict) for record in records)
+
+
+def test_job_monitor_retries_temporary_errors(alma, fake):
+    polls = []
+
+    def instance(params):
+        polls.append(1)
+        if len(polls) == 1:
+            return (429, {'errorList': {'error': [{'errorCode': '429',
+                                                   'errorMessage': 'Throttled'}]}})
+        if len(polls) == 2:
+            return {'status': {'value': 'RUNNING'}, 'progress': 50}
+        return {'status': {'value': 'COMPLETED_SUCCESS'}, 'progress': 100}
+
+    fake.route('/almaws/v1/conf/jobs/J1/instances/I1', instance)
+    monitor = alma.conf.jobs.monitor(min_interval=0.01, max_interval=0.05)
+    result = monitor.watch('J1', 'I1').result(timeout=5)
+    assert result['status']['value'] == 'COMPLETED_SUCCESS'
+    assert len(polls) == 3
+
+
+def test_job_monitor_fails_on_client_errors(alma, fake):
+    fake.fail('/almaws/v1/conf/jobs/J1/instances/I2', 400, 'Unknown instance')
+    monitor = alma.conf.jobs.monitor(min_interval=0.01, max_interval=0.05)
+    with pytest.raises(utils.AlmaError):
+        monitor.watch('J1', 'I2').result(timeout=5)
+
+
+def test_snapshot(alma, fake):
+    fake.route('/almaws/v1/conf/libraries', {'library': [
+        {'code': 'MAIN', 'name': 'Main Library'}, {'code': 'LAW', 'name': 'Law'}]})
+    fake.route('/almaws/v1/conf/departments', {'department': [{'code': 'ACQ'}]})
+    fake.route('/almaws/v1/conf/libraries/MAIN/locations', {'location': [
+        {'code': 'STACKS', 'name': 'Stacks'}]})
+    fake.route('/almaws/v1/conf/libraries/LAW/locations', {'location': []})
+    fake.route('/almaws/v1/conf/code-tables/UserGroups', {'row': [
+        {'code': 'UG', 'description': 'Undergraduate'}]})
+
+    snapshot = alma.conf.snapshot(code_tables=['UserGroups'])
+    assert snapshot.library_name('MAIN') == 'Main Library'
+    assert snapshot.location_name('MAIN', 'STACKS') == 'Stacks'
+    assert snapshot.describe('UserGroups', 'UG') == 'Undergraduate'
+
+
+def test_open_hours(alma, fake):
+    today = datetime.date.today()
+
+    def hours(params):
+        first = datetime.date.fromisoformat(params['from'])
+        last = datetime.date.fromisoformat(params['to'])
+        days = [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+        return {'day': [{'date': day.isoformat() + 'Z',
+                         'hour': [{'from': '09:00', 'to': '17:00'}]} for day in days]}
+
+    fake.route('/almaws/v1/conf/libraries/MAIN/open-hours', hours)
+    service = alma.conf.general.open_hours(['MAIN'], days=60)
+    assert fake.count('/almaws/v1/conf/libraries/MAIN/open-hours') == 3
+
+    noon = datetime.datetime.combine(today + datetime.timedelta(days=40), datetime.time(12))
+    assert service.is_open('MAIN', noon)
+    assert not service.is_open('MAIN', noon.replace(hour=20))
+    assert service.next_open('MAIN', noon.replace(hour=20)) == noon.replace(hour=9) + datetime.timedelta(days=1)
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_snapshot_profiles(fake, tmp_path, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    profiles = [{'id': 'D1', 'name': 'One'}, {'id': 'D2', 'name': 'Two'}]
+    fake.pages('/almaws/v1/conf/deposit-profiles', 'deposit_profile', profiles)
+    fake.pages('/almaws/v1/conf/md-import-profiles', 'import_profile', [])
+    fake.pages('/almaws/v1/conf/reminders', 'reminder', [])
+    for profile in profiles:
+        fake.route('/almaws/v1/conf/deposit-profiles/' + profile['id'], dict(profile, detail=1))
+
+    report = alma.conf.snapshot_profiles(str(tmp_path))
+    assert report['deposit_profiles']['added'] == ['D1', 'D2']
+
+    profiles[1] = {'id': 'D2', 'name': 'Renamed'}
+    fake.route('/almaws/v1/conf/deposit-profiles/D2', dict(profiles[1], detail=2))
+    report = alma.conf.snapshot_profiles(str(tmp_path))
+    assert report['deposit_profiles'] == {'added': [], 'changed': ['D2'], 'removed': []}
+    assert fake.count('/almaws/v1/conf/deposit-profiles/D1') == 1
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+from almapipy import export
+
+
+def test_export_reading_lists(alma, fake, sink, tmp_path):
+    fake.pages('/almaws/v1/courses', 'course', [
+        {'id': 'C1', 'code': 'HIST101', 'last_modified_date': '2026-01-01Z'},
+        {'id': 'C2', 'code': 'EMPTY', 'last_modified_date': '2026-01-01Z'}])
+    fake.route('/almaws/v1/courses/C1/reading-lists', {'reading_list': [{'id': 'L1'}]})
+    fake.route('/almaws/v1/courses/C2/reading-lists', {})
+    fake.route('/almaws/v1/courses/C1/reading-lists/L1/owners',
+               {'owner': [{'primary_id': 'prof'}]})
+    fake.route('/almaws/v1/courses/C1/reading-lists/L1/citations',
+               {'citation': [{'id': 'X1', 'metadata': {'title': 'Book'}},
+                             {'id': 'X2', 'metadata': {'title': 'Article'}}]})
+    for citation_id in ['X1', 'X2']:
+        fake.route('/almaws/v1/courses/C1/reading-lists/L1/citations/{}/tags'.format(citation_id),
+                   {'tag': [{'value': 'required'}]})
+
+    checkpoint = export.Checkpoint(str(tmp_path / 'done.txt'))
+    stats = alma.courses.export_reading_lists(sink, checkpoint=checkpoint)
+    assert stats['done'] == 2 and not stats['failed']
+    titles = sorted(row['citation_title'] or '' for row in sink.rows)
+    assert titles == ['', 'Article', 'Book']
+    assert all(row['tags'] == ['required'] for row in sink.rows if row['citation_id'])
+
+    stats = alma.courses.export_reading_lists(sink, checkpoint=checkpoint)
+    assert stats['skipped'] == 2
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+
+def test_export_portfolios(alma, fake, sink):
+    fake.pages('/almaws/v1/electronic/e-collections', 'electronic_collection',
+               [{'id': 'E1', 'public_name': 'Journals'}])
+    fake.route('/almaws/v1/electronic/e-collections/E1/e-services',
+               {'electronic_service': [{'id': 'S1'}, {'id': 'S2'}]})
+    fake.pages('/almaws/v1/electronic/e-collections/E1/e-services/S1/portfolios',
+               'portfolio', [{'id': str(i)} for i in range(250)])
+    fake.pages('/almaws/v1/electronic/e-collections/E1/e-services/S2/portfolios',
+               'portfolio', [])
+
+    stats = alma.electronic.export_portfolios(sink)
+    assert stats['done'] == 1 and not stats['failed']
+    assert sorted(int(row['id']) for row in sink.rows) == list(range(250))
+    assert all(row['collection_name'] == 'Journals' for row in sink.rows)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+
+import pytest
+
+from almapipy import export, utils
+
+
+def test_stream_records_alma_errors(sink):
+    def fetch(item):
+        if item == 2:
+            raise utils.AlmaError('Not found', 404)
+        return [item]
+
+    stats = export.stream(range(4), fetch, sink)
+    assert sorted(sink.rows) == [0, 1, 3]
+    assert list(stats['failed']) == ['2']
+
+
+def test_stream_raises_bugs(sink):
+    def fetch(item):
+        raise AttributeError('bug')
+
+    with pytest.raises(AttributeError):
+        export.stream(range(4), fetch, sink)
+
+
+def test_crawl_raises_bugs(sink):
+    def expand(node):
+        raise TypeError('bug')
+
+    with pytest.raises(TypeError):
+        export.crawl(range(4), expand, sink)
+
+
+def read_chunk(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)['@graph']
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_jsonld_chunks_are_appended_and_completed(tmp_path, compress):
+    prefix = str(tmp_path / 'catalog')
+    suffix = '.jsonld.gz' if compress else '.jsonld'
+    with export.JSONLDChunkSink(prefix, chunk_size=3, compress=compress) as sink:
+        for i in range(4):
+            sink.write({'@id': str(i)})
+            sink.flush()
+        sink.write({'@id': '4'})
+    assert read_chunk(prefix + '-00001' + suffix) == [{'@id': str(i)} for i in range(3)]
+    assert read_chunk(prefix + '-00002' + suffix) == [{'@id': '3'}, {'@id': '4'}]
+    assert sorted(os.listdir(str(tmp_path))) == ['catalog-00001' + suffix,
+                                                 'catalog-00002' + suffix]
+
+
+def test_jsonld_flush_only_appends(tmp_path):
+    sink = export.JSONLDChunkSink(str(tmp_path / 'catalog'), compress=False)
+    part = str(tmp_path / 'catalog-00001.jsonld.part')
+    sink.write({'@id': '1'})
+    sink.flush()
+    with open(part, encoding='utf-8') as f:
+        first = f.read()
+    sink.write({'@id': '2'})
+    sink.flush()
+    with open(part, encoding='utf-8') as f:
+        assert f.read().startswith(first)
+    sink.close()
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_jsonld_interrupted_chunk_is_recovered(tmp_path, compress):
+    prefix = str(tmp_path / 'catalog')
+    suffix = '.jsonld.gz' if compress else '.jsonld'
+    crashed = export.JSONLDChunkSink(prefix, compress=compress)
+    crashed.write({'@id': '1'})
+    crashed.write({'@id': '2'})
+    crashed.flush()
+    # Written after the last flush, so not checkpointed and lost.
+    crashed.write({'@id': '3'})
+
+    with export.JSONLDChunkSink(prefix, compress=compress) as sink:
+        assert sink.chunk == 2
+        sink.write({'@id': '3'})
+    assert read_chunk(prefix + '-00001' + suffix) == [{'@id': '1'}, {'@id': '2'}]
+    assert read_chunk(prefix + '-00002' + suffix) == [{'@id': '3'}]
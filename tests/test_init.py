@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import almapipy
+from almapipy.client import Client
+
+
+class SlowClient(Client):
+    built = 0
+
+    def __init__(self, cnxn_params={}):
+        self.cnxn_params = cnxn_params.copy()
+        time.sleep(0.05)
+        SlowClient.built += 1
+
+
+def test_subclients_are_built_once(alma):
+    assert alma.users is alma.users
+    assert alma.users.loans is alma.users.loans
+    assert alma.bibs.catalog.cnxn_params['api_key'] == 'key'
+    with pytest.raises(AttributeError):
+        alma.no_such_api
+
+
+def test_concurrent_first_access_shares_the_subclient(alma):
+    SlowClient.built = 0
+    alma.__lazy__(slow=SlowClient)
+    barrier = threading.Barrier(8)
+    found = []
+
+    def access():
+        barrier.wait()
+        found.append(alma.slow)
+    threads = [threading.Thread(target=access) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert SlowClient.built == 1
+    assert all(subclient is found[0] for subclient in found)
+
+
+def test_legacy_names_resolve():
+    from almapipy import SubClientBibs, marc
+    from almapipy.bibs import SubClientBibs as bibs_class
+    assert SubClientBibs is bibs_class
+    assert almapipy.SubClientUsers.__module__ == 'almapipy.users'
+    assert marc.decode is almapipy.marc.decode
+    assert 'SubClientBibs' in dir(almapipy) and 'export' in dir(almapipy)
+    with pytest.raises(AttributeError):
+        almapipy.SubClientNothing
+
+
+def test_api_modules_load_on_first_use():
+    script = ("import sys, almapipy\n"
+              "alma = almapipy.AlmaCnxn('key')\n"
+              "before = 'almapipy.bibs' in sys.modules\n"
+              "alma.bibs\n"
+              "print(before, 'almapipy.bibs' in sys.modules, 'almapipy.users' in sys.modules)\n")
+    output = subprocess.check_output([sys.executable, '-c', script],
+                                     cwd=almapipy.__path__[0] + '/..')
+    assert output.split() == [b'False', b'True', b'False']
+
+
+def test_connection_parameters_are_read_only(alma):
+    for client in [alma, alma.users, alma.users.loans, alma.analytics]:
+        with pytest.raises(TypeError):
+            client.cnxn_params['api_key'] = 'other'
+        with pytest.raises(TypeError):
+            client.cnxn_params['xml_ns']['report'] = 'urn:other'
+    # copy() still gives a regular dictionary to build new parameters from.
+    params = alma.users.cnxn_params.copy()
+    params['api_key'] = 'other'
+    assert alma.users.cnxn_params['api_key'] == 'key'
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import almapipy
+from almapipy import marc, utils
+
+RECORD = ('<record><leader>00000nam a2200000 a 4500</leader>'
+          '<controlfield tag="001">99</controlfield>'
+          '<datafield tag="245" ind1="1" ind2="0">'
+          '<subfield code="a">A title</subfield><subfield code="c">An author</subfield>'
+          '</datafield></record>')
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_decode_bib_response(fake, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    fake.route('/almaws/v1/bibs/99', {'mms_id': '99', 'anies': [RECORD]})
+
+    records = marc.decode(alma.bibs.catalog.get('99'), fields=['245'])
+    assert len(records) == 1
+    assert records[0].get_value('245', 'a') == 'A title'
+
+
+def test_decode_rejects_other_types():
+    with pytest.raises(utils.ArgError):
+        marc.decode('<record/>')
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import almapipy
+from almapipy import utils
+
+PARTNERS = '/almaws/v1/partners'
+
+
+def test_directory_indexes_partners_by_code(alma, fake):
+    partners = [{'partner_details': {'code': 'P{}'.format(i), 'name': 'Partner {}'.format(i)}}
+                for i in range(120)]
+    fake.pages(PARTNERS, 'partner', partners)
+    directory = alma.partners.directory()
+    assert len(directory) == 120
+    assert 'P7' in directory
+    assert directory.name('P7') == 'Partner 7'
+    assert directory.get('missing') is None
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_get_lending_requests_joins_partners(fake, lazy):
+    alma = almapipy.AlmaCnxn('key', lazy=lazy)
+    fake.pages(PARTNERS, 'partner', [{'partner_details': {'code': 'P1'}}])
+    fake.route(PARTNERS + '/P1/lending-requests/R1', {'request_id': 'R1'})
+    fake.fail(PARTNERS + '/P1/lending-requests/R2', 400, 'No such request')
+
+    results = alma.partners.get_lending_requests([('P1', 'R1'), ('P1', 'R1'), ('P1', 'R2')])
+    assert results[('P1', 'R1')] == {'request_id': 'R1',
+                                     'partner': {'partner_details': {'code': 'P1'}}}
+    assert isinstance(results[('P1', 'R2')], utils.AlmaError)
+    assert fake.count(PARTNERS + '/P1/lending-requests/R1') == 1
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from almapipy import utils
+from almapipy.task_lists import TaskListWatcher
+
+RESOURCES = '/almaws/v1/task-lists/requested-resources'
+
+
+def test_watcher_keeps_errors_per_desk(alma, fake):
+    resources = [{'id': 'R1'}]
+    state = {'fail': False}
+
+    def handler(params):
+        if state['fail']:
+            return 500, {'errorList': {'error': [{'errorCode': '500',
+                                                  'errorMessage': 'Down'}]}}
+        return {'requested_resource': resources, 'total_record_count': len(resources)}
+    fake.route(RESOURCES, handler)
+
+    events = []
+    watcher = TaskListWatcher(alma.task_lists.resources, [('MAIN', 'DESK')],
+                              callback=lambda *event: events.append(event), jitter=0)
+    watcher.poll(notify=False)
+    assert watcher.errors == {}
+
+    state['fail'] = True
+    assert watcher.poll() == {}
+    assert isinstance(watcher.errors[('MAIN', 'DESK')], utils.AlmaError)
+    assert watcher.current('MAIN', 'DESK') == resources
+
+    state['fail'] = False
+    resources.append({'id': 'R2'})
+    assert watcher.poll() == {('MAIN', 'DESK'): ([{'id': 'R2'}], [])}
+    assert watcher.errors == {}
+    assert events == [('MAIN', 'DESK', [{'id': 'R2'}], [])]
+
+
+LENDING = '/almaws/v1/task-lists/rs/lending-requests'
+
+
+def test_get_all_collapses_identical_calls(alma, fake):
+    fake.route(LENDING, lambda params: {'user_resource_sharing_request': [
+        {'request_id': params['library'] + '-1'}, {'request_id': 'SHARED'}]})
+    fake.delay = 0.05
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        alma.task_lists.lending.get_all(['A', 'B']))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fake.count(LENDING) == 2
+    assert len(results) == 8
+    for result in results:
+        assert [r['request_id'] for r in result['requests']] == ['A-1', 'B-1', 'SHARED']
+
+
+def test_get_all_does_not_block_other_libraries(alma, fake):
+    entered = threading.Event()
+    started = threading.Event()
+
+    def handler(params):
+        if params['library'] == 'A':
+            entered.set()
+            # Only returns once a call for another library got through.
+            assert started.wait(5)
+        else:
+            started.set()
+        return {'user_resource_sharing_request': [{'request_id': params['library']}]}
+    fake.route(LENDING, handler)
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(
+        alma.task_lists.lending.get_all(['A'])))
+    first.start()
+    assert entered.wait(5)
+    alma.task_lists.lending.get_all(['B'])
+    first.join()
+    assert results[0]['requests'] == [{'request_id': 'A'}]
+
+
+def test_get_all_caches_copies_of_complete_results_only(alma, fake):
+    state = {'fail': True}
+
+    def handler(params):
+        if params['library'] == 'B' and state['fail']:
+            return 500, {'errorList': {'error': [{'errorCode': '500',
+                                                  'errorMessage': 'Down'}]}}
+        return {'user_resource_sharing_request': [{'request_id': params['library']}]}
+    fake.route(LENDING, handler)
+
+    lending = alma.task_lists.lending
+    first = lending.get_all(['A', 'B'])
+    assert list(first['failed']) == ['B']
+
+    state['fail'] = False
+    second = lending.get_all(['A', 'B'])
+    assert second['failed'] == {}
+    assert fake.count(LENDING) == 4
+
+    second['requests'][0]['request_id'] = 'changed'
+    third = lending.get_all(['A', 'B'])
+    assert [r['request_id'] for r in third['requests']] == ['A', 'B']
+    assert fake.count(LENDING) == 4